@@ -0,0 +1,100 @@
+from collections import Counter
+from datetime import datetime, timezone
+
+from face_pipeline import emotion_mapping
+
+# Rollup granularities: table name and bucket width in seconds. Buckets are UTC.
+GRANULARITIES = {
+    "hour": ("emotion_rollup_hourly", 3600),
+    "day": ("emotion_rollup_daily", 86400),
+}
+
+# Rollup rows for logs without a known user / emotion, and the per-bucket total over all users
+UNKNOWN_USER = 0
+UNKNOWN_EMOTION = -1
+ALL_USERS = -1
+
+
+def create_rollup_schema(conn):
+    for table, _ in GRANULARITIES.values():
+        conn.execute(f'''CREATE TABLE IF NOT EXISTS {table} (
+                        user_id INTEGER NOT NULL,
+                        bucket INTEGER NOT NULL,
+                        emotion INTEGER NOT NULL,
+                        count INTEGER NOT NULL,
+                        PRIMARY KEY (user_id, bucket, emotion)
+                    ) WITHOUT ROWID''')
+
+
+def update_rollups(conn, rows):
+    """Add (user_id, emotion, ts, ...) log rows to the hourly and daily rollups; the caller commits"""
+    for table, width in GRANULARITIES.values():
+        counts = Counter()
+        for row in rows:
+            user_id, emotion, ts = row[0], row[1], row[2]
+            key = (ts - ts % width, UNKNOWN_EMOTION if emotion is None else emotion)
+            counts[(UNKNOWN_USER if user_id is None else user_id,) + key] += 1
+            counts[(ALL_USERS,) + key] += 1
+        conn.executemany(
+            f'INSERT INTO {table} (user_id, bucket, emotion, count) VALUES (?, ?, ?, ?) '
+            f'ON CONFLICT (user_id, bucket, emotion) DO UPDATE SET count = count + excluded.count',
+            [key + (count,) for key, count in counts.items()]
+        )
+
+
+def rebuild_rollups(conn):
+    """Recompute every rollup from emotion_logs (used once after a migration or an upgrade)"""
+    for table, width in GRANULARITIES.values():
+        conn.execute(f'DELETE FROM {table}')
+        for user_expr in (f'COALESCE(user_id, {UNKNOWN_USER})', str(ALL_USERS)):
+            conn.execute(
+                f'INSERT INTO {table} (user_id, bucket, emotion, count) '
+                f'SELECT {user_expr}, ts - ts % {width}, COALESCE(emotion, {UNKNOWN_EMOTION}), COUNT(*) '
+                f'FROM emotion_logs GROUP BY 1, 2, 3'
+            )
+
+
+def rollups_need_rebuild(conn):
+    """True when there are logs but no rollups yet (logs written before rollups existed)"""
+    has_rollups = conn.execute(f'SELECT 1 FROM {GRANULARITIES["day"][0]} LIMIT 1').fetchone()
+    has_logs = conn.execute('SELECT 1 FROM emotion_logs LIMIT 1').fetchone()
+    return bool(has_logs) and not has_rollups
+
+
+def _bucket_label(bucket, granularity):
+    fmt = "%Y-%m-%d" if granularity == "day" else "%Y-%m-%d %H:00"
+    return datetime.fromtimestamp(bucket, tz=timezone.utc).strftime(fmt)
+
+
+def emotion_distribution(conn, granularity="day", user_id=None, start=None, end=None):
+    """Emotion counts per bucket for one user (or all users), read straight from the rollups.
+
+    start / end are epoch seconds. Cost is proportional to the number of buckets
+    in the range, not to the number of log rows.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity: {granularity}")
+    table, width = GRANULARITIES[granularity]
+    clauses, params = ['user_id = ?'], [ALL_USERS if user_id is None else user_id]
+    if start is not None:
+        clauses.append('bucket >= ?')
+        params.append(start - start % width)
+    if end is not None:
+        clauses.append('bucket <= ?')
+        params.append(end)
+    buckets = {}
+    for bucket, emotion, count in conn.execute(
+            f'SELECT bucket, emotion, count FROM {table} WHERE {" AND ".join(clauses)} ORDER BY bucket', params):
+        label = emotion_mapping.get(emotion, 'unknown')
+        counts = buckets.setdefault(bucket, {})
+        counts[label] = counts.get(label, 0) + count
+    return [{"bucket": _bucket_label(bucket, granularity), "start": bucket, "counts": counts}
+            for bucket, counts in buckets.items()]
+
+
+def emotion_totals(buckets):
+    """Total count per emotion over the buckets returned by emotion_distribution"""
+    totals = Counter()
+    for bucket in buckets:
+        totals.update(bucket["counts"])
+    return dict(totals)
@@ -1,10 +1,10 @@
 
 from dotenv import load_dotenv
 import os
-import base64
-from requests import post, get
-import json
 import urllib.parse
+from recommendation_cache import cache as recommendation_cache
+from recommendation_snapshot import RECOMMENDATION_MODE, snapshot as recommendation_snapshot
+from spotify_client import fetch_concurrently, get_playlist_items, get_token_manager, spotify_get
 
 # Load environment variables
 load_dotenv()
@@ -47,46 +47,18 @@ podcast_dist = {
 }
 
 def get_token():
-    """Get Spotify access token dynamically"""
-    auth_string = client_id + ":" + client_secret
-    auth_bytes = auth_string.encode("utf-8")
-    auth_base64 = str(base64.b64encode(auth_bytes), "utf-8")
-    
-    url = "https://accounts.spotify.com/api/token"
-    headers = {
-        "Authorization": "Basic " + auth_base64,
-        "Content-Type": "application/x-www-form-urlencoded"
-    }
-    data = {"grant_type": "client_credentials"}
-    
-    result = post(url, headers=headers, data=data)
-
-    if result.status_code != 200:
-        print(f"❌ Failed Request (Status {result.status_code}):", result.text)
-        return None
-
-    json_result = json.loads(result.content)
-    token = json_result.get("access_token")
-
-    if not token:
-        print("❌ Token retrieval failed. Response:", json_result)
-        return None
-    
-    return token
-
-def get_track_details(playlist_id, token):
-    """Fetch track details from a Spotify playlist"""
-    url = f"https://api.spotify.com/v1/playlists/{playlist_id}/tracks"
-    headers = {"Authorization": f"Bearer {token}"}
-    
-    response = get(url, headers=headers)
-    if response.status_code != 200:
-        print(f"❌ Failed to fetch playlist (Status {response.status_code}):", response.text)
+    """Get Spotify access token, reused until shortly before it expires"""
+    return get_token_manager(client_id, client_secret).get_token()
+
+def get_track_details(playlist_id, token, limit=5):
+    """Fetch details of the first limit tracks of a Spotify playlist"""
+    items, error_response = get_playlist_items(playlist_id, token, limit)
+    if error_response is not None:
+        print(f"❌ Failed to fetch playlist (Status {error_response.status_code}):", error_response.text)
         return []
-    
-    data = response.json()
+
     tracks = []
-    for item in data['items']:
+    for item in items:
         track = item['track']
         # Construct YouTube search URL
         query = f"{track['name']} {track['artists'][0]['name']} official video"
@@ -102,12 +74,9 @@ def get_track_details(playlist_id, token):
         })
     return tracks
 
-def get_podcast_details(show_id, token):
-    """Fetch podcast details from a Spotify show"""
-    url = f"https://api.spotify.com/v1/shows/{show_id}/episodes?limit=5"
-    headers = {"Authorization": f"Bearer {token}"}
-    
-    response = get(url, headers=headers)
+def get_podcast_details(show_id, token, limit=5):
+    """Fetch details of the latest limit episodes of a Spotify show"""
+    response = spotify_get(f"shows/{show_id}/episodes", token, params={"limit": limit})
     if response.status_code != 200:
         print(f"❌ Failed to fetch podcast (Status {response.status_code}):", response.text)
         return []
@@ -138,20 +107,22 @@ def get_podcast_details(show_id, token):
     
     return podcasts
 
-def recommend_media(emotion_id):
+def fetch_recommendations(emotion_id):
     """Fetch both music and podcast recommendations based on emotion"""
-    token = get_token()
-    if not token:
+    # Calls get the manager rather than the token string, so a revoked token is replaced and retried
+    token = get_token_manager(client_id, client_secret)
+    if not token.get_token():
         print("❌ Failed to get Spotify token.")
         return None
 
-    # Get music recommendations
     playlist_id = music_dist.get(emotion_id, music_dist[3])  # Default to neutral
-    tracks = get_track_details(playlist_id, token)
-    
-    # Get podcast recommendations
     show_id = podcast_dist.get(emotion_id, podcast_dist[3])  # Default to neutral
-    podcasts = get_podcast_details(show_id, token)
+
+    # Music and podcast requests are independent, fetch them in parallel
+    tracks, podcasts = fetch_concurrently(
+        (get_track_details, playlist_id, token, 5),
+        (get_podcast_details, show_id, token, 3),
+    )
 
     if not tracks and not podcasts:
         print("❌ No recommendations found.")
@@ -175,6 +146,13 @@ def recommend_media(emotion_id):
 
     return recommendations
 
+def recommend_media(emotion_id):
+    """Recommendations for an emotion, served from the TTL cache and refreshed in the background"""
+    if RECOMMENDATION_MODE == "snapshot":
+        # Pre-fetched by recommendation_snapshot.py, no network I/O
+        return recommendation_snapshot.get("api", emotion_id)
+    return recommendation_cache.get(f"api:{emotion_id}", lambda: fetch_recommendations(emotion_id))
+
 # Example usage
 if __name__ == "__main__":
     # Test with a specific emotion (e.g., Angry)
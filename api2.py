@@ -1,9 +1,9 @@
 from dotenv import load_dotenv
 import os
-import base64
-from requests import post, get
-import json
 import urllib.parse
+from recommendation_cache import cache as recommendation_cache
+from recommendation_snapshot import RECOMMENDATION_MODE, snapshot as recommendation_snapshot
+from spotify_client import fetch_concurrently, get_playlist_items, get_token_manager, spotify_get
 
 # Load environment variables
 load_dotenv()
@@ -57,40 +57,18 @@ podcast_dist = {
 }
 
 def get_token():
-    """Get Spotify access token dynamically"""
-    auth_string = client_id + ":" + client_secret
-    auth_bytes = auth_string.encode("utf-8")
-    auth_base64 = str(base64.b64encode(auth_bytes), "utf-8")
-    
-    url = "https://accounts.spotify.com/api/token"
-    headers = {
-        "Authorization": "Basic " + auth_base64,
-        "Content-Type": "application/x-www-form-urlencoded"
-    }
-    data = {"grant_type": "client_credentials"}
-    
-    result = post(url, headers=headers, data=data)
-
-    if result.status_code != 200:
-        print(f"❌ Failed Request (Status {result.status_code}):", result.text)
-        return None
-
-    json_result = json.loads(result.content)
-    return json_result.get("access_token")
-
-def get_track_details(playlist_id, token):
-    """Fetch track details from a Spotify playlist"""
-    url = f"https://api.spotify.com/v1/playlists/{playlist_id}/tracks"
-    headers = {"Authorization": f"Bearer {token}"}
-    
-    response = get(url, headers=headers)
-    if response.status_code != 200:
-        print(f"❌ Failed to fetch playlist (Status {response.status_code}):", response.text)
+    """Get Spotify access token, reused until shortly before it expires"""
+    return get_token_manager(client_id, client_secret).get_token()
+
+def get_track_details(playlist_id, token, limit=5):
+    """Fetch details of the first limit tracks of a Spotify playlist"""
+    items, error_response = get_playlist_items(playlist_id, token, limit)
+    if error_response is not None:
+        print(f"❌ Failed to fetch playlist (Status {error_response.status_code}):", error_response.text)
         return []
 
-    data = response.json()
     tracks = []
-    for item in data.get('items', []):
+    for item in items:
         track = item['track']
         query = f"{track['name']} {track['artists'][0]['name']} official video"
         youtube_url = "https://www.youtube.com/results?search_query=" + urllib.parse.quote(query)
@@ -105,12 +83,9 @@ def get_track_details(playlist_id, token):
         })
     return tracks
 
-def get_podcast_details(show_id, token):
-    """Fetch podcast details from a Spotify show"""
-    url = f"https://api.spotify.com/v1/shows/{show_id}/episodes?limit=5"
-    headers = {"Authorization": f"Bearer {token}"}
-    
-    response = get(url, headers=headers)
+def get_podcast_details(show_id, token, limit=5):
+    """Fetch details of the latest limit episodes of a Spotify show"""
+    response = spotify_get(f"shows/{show_id}/episodes", token, params={"limit": limit})
     if response.status_code != 200:
         print(f"❌ Failed to fetch podcast (Status {response.status_code}):", response.text)
         return []
@@ -129,21 +104,28 @@ def get_podcast_details(show_id, token):
         })
     return podcasts
 
-def recommend_media(emotion_id):
+def fetch_recommendations(emotion_id):
     """Fetch both music (English + Hindi) and podcast recommendations based on emotion"""
-    token = get_token()
-    if not token:
+    # Calls get the manager rather than the token string, so a revoked token is replaced and retried
+    token = get_token_manager(client_id, client_secret)
+    if not token.get_token():
         print("❌ Failed to get Spotify token.")
         return None
 
     english_playlist_id = english_music_dist.get(emotion_id, english_music_dist[3])
     hindi_playlist_id = hindi_music_dist.get(emotion_id, hindi_music_dist[3])
 
-    english_tracks = get_track_details(english_playlist_id, token)[:5]
-    hindi_tracks = get_track_details(hindi_playlist_id, token)[:5]
-
     show_id = podcast_dist.get(emotion_id, podcast_dist[3])
-    podcasts = get_podcast_details(show_id, token)[:3]
+
+    # The three requests are independent, fetch them in parallel
+    english_tracks, hindi_tracks, podcasts = fetch_concurrently(
+        (get_track_details, english_playlist_id, token, 5),
+        (get_track_details, hindi_playlist_id, token, 5),
+        (get_podcast_details, show_id, token, 3),
+    )
+    english_tracks = english_tracks[:5]
+    hindi_tracks = hindi_tracks[:5]
+    podcasts = podcasts[:3]
 
     recommendations = {
         "emotion": emotion_dict[emotion_id],
@@ -153,6 +135,13 @@ def recommend_media(emotion_id):
 
     return recommendations
 
+def recommend_media(emotion_id):
+    """Recommendations for an emotion, served from the TTL cache and refreshed in the background"""
+    if RECOMMENDATION_MODE == "snapshot":
+        # Pre-fetched by recommendation_snapshot.py, no network I/O
+        return recommendation_snapshot.get("api2", emotion_id)
+    return recommendation_cache.get(f"api2:{emotion_id}", lambda: fetch_recommendations(emotion_id))
+
 # Example usage
 if __name__ == "__main__":
     emotion_id = 1  # Example: Fear
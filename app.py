@@ -6,23 +6,55 @@ from werkzeug.security import generate_password_hash, check_password_hash
 import re
 import cv2
 import numpy as np
-from tensorflow.keras.models import load_model
 import io
-from datetime import datetime
+import json
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from api import recommend_media, emotion_dict
+from inference_server import BatchScheduler
+from face_pipeline import IMAGE_EXTENSIONS, IMG_SIZE, emotion_mapping, preprocess_faces, thread_face_buffer
+from model_registry import ModelNotAvailable, registry as model_registry
+import threading
+import atexit
+from db import get_connection
+from log_writer import LogWriter
+from emotion_logs import DEFAULT_PAGE_SIZE, create_log_schema, media_from_recommendations, parse_date_bound, query_logs
+from migrate_logs import has_legacy_logs, migrate_legacy_logs, report_migration
+from analytics import GRANULARITIES, emotion_distribution, emotion_totals, rebuild_rollups, rollups_need_rebuild
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from live_sessions import store as live_store
+from live_socket import serve_frames
+from face_tracker import FaceTracker, TrackerPool
+from image_io import MAX_IMAGE_BYTES, MB, ImageTooLarge, decode_image, read_upload
+from result_cache import cache as result_cache
+try:
+    from flask_sock import Sock
+except ImportError:
+    # Live streaming falls back to one POST /live_webcam per frame
+    Sock = None
 
 app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY', 'your_secret_key')
+# Request bodies are capped before the form is parsed: Werkzeug answers 413 from the Content-Length
+# (or stops reading at the cap). The default fits one image plus form fields, which covers
+# /upload_image and /live_webcam; /upload_images raises it to MAX_BATCH_REQUEST_BYTES.
+FORM_OVERHEAD = 64 * 1024
+app.config['MAX_CONTENT_LENGTH'] = MAX_IMAGE_BYTES + FORM_OVERHEAD
+MAX_BATCH_REQUEST_BYTES = int(float(os.getenv('MAX_REQUEST_MB', '256')) * MB)
 
 DATABASE = 'users.db'
 
 def get_db_connection():
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+    # Pooled WAL-mode connection; conn.close() hands it back to the pool (see db.py)
+    return get_connection(DATABASE)
+
+# Emotion logs are written behind the request by a background thread in batched transactions
+log_writer = LogWriter(DATABASE)
+atexit.register(log_writer.shutdown)
 
 def init_db():
     conn = get_db_connection()
@@ -35,8 +67,6 @@ def init_db():
     conn.commit()
     conn.close()
 
-init_db()
-
 ADMIN_EMAIL = os.getenv('ADMIN_EMAIL', 'admin@example.com')
 ADMIN_PASSWORD_HASH = generate_password_hash(os.getenv('ADMIN_PASSWORD', 'adminpassword'))
 
@@ -47,38 +77,102 @@ def validate_email(email):
 def validate_password(password):
     return len(password) >= 8
 
-# Load emotion detection model
-model_path = "C:\\Users\\abhi9\\Desktop\\emotion_detection\\model.h5"
-if os.path.exists(model_path):
-    model = load_model(model_path, compile=False)
-    print("Model loaded successfully.")
-else:
-    print(f"Error: Model file not found at {model_path}")
-    exit()
-
-# Emotion detection setup
-face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-img_size = 224
-emotion_mapping = {0: 'sad', 1: 'fear', 2: 'surprise', 3: 'neutral', 4: 'disgust', 5: 'happy', 6: 'angry'}
-
-def predict_emotion_from_image(img):
+# The emotion model and the face detector are loaded on first inference (see model_registry.py);
+# set EMOTION_WARMUP=1 to load them on a background thread at startup instead.
+if model_registry.config['warmup']:
+    model_registry.warm_up()
+
+def get_face_detector():
+    return model_registry.get_face_detector()
+
+img_size = IMG_SIZE
+
+# Face crops from concurrent requests are classified together in shared batches
+INFERENCE_BATCHING = os.getenv('INFERENCE_BATCHING', '1') != '0'
+inference_scheduler = BatchScheduler(
+    lambda batch: model_registry.get_model().predict(batch),
+    max_batch_size=int(os.getenv('INFERENCE_MAX_BATCH', '32')),
+    max_delay_ms=float(os.getenv('INFERENCE_MAX_DELAY_MS', '5')),
+)
+atexit.register(inference_scheduler.shutdown)
+INFERENCE_TIMEOUT = float(os.getenv('INFERENCE_TIMEOUT_S', '60'))
+
+def classify_faces(face_batch):
+    """Run a batch of preprocessed faces through the model, returns (N, classes) probabilities"""
+    if INFERENCE_BATCHING:
+        # Load the model first, so the timeout covers inference and not the (slow) first load
+        model_registry.get_model()
+        return inference_scheduler.predict(face_batch, timeout=INFERENCE_TIMEOUT)
+    return model_registry.get_model().predict(face_batch)
+
+def classify_image(img):
+    """Detect every face in the image and classify all of them in one forward pass.
+
+    Returns (faces, emotion ids, class probabilities per face) in detection order.
+    """
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    faces = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
-    detected_emotions = []
-    for (x, y, w, h) in faces:
-        face = gray[y:y+h, x:x+w]
-        face = cv2.resize(face, (img_size, img_size))
-        rgb_face = np.stack((face,) * 3, axis=-1)  # Convert to RGB
-        rgb_face = rgb_face / 255.0
-        rgb_face = np.expand_dims(rgb_face, axis=0)  # Add batch dimension
-        prediction = model.predict(rgb_face, verbose=0)
-        emotion_idx = int(np.argmax(prediction))
-        detected_emotions.append(emotion_idx)
+    faces = get_face_detector().detect(gray)
+    if len(faces) == 0:
+        return faces, [], []
+    face_batch = preprocess_faces(gray, faces, thread_face_buffer())  # (N, img_size, img_size, 3), reused per thread
+    predictions = classify_faces(face_batch)
+    detected_emotions = [int(idx) for idx in np.argmax(predictions, axis=1)]
+    return faces, detected_emotions, predictions
+
+def annotate_faces(img, faces, detected_emotions):
+    for (x, y, w, h), emotion_idx in zip(faces, detected_emotions):
         emotion_label = emotion_mapping[emotion_idx]
         cv2.rectangle(img, (x, y), (x+w, y+h), (255, 0, 0), 2)
         cv2.putText(img, emotion_label, (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (255, 0, 0), 2)
+    return img
+
+def detections_json(shape, faces, detected_emotions, probabilities):
+    """Boxes, labels and class probabilities of every face, for clients that draw their own overlay.
+
+    shape is the (height, width) of the decoded image, e.g. img.shape.
+    """
+    height, width = shape[:2]
+    return {
+        "width": width,
+        "height": height,
+        "faces": [{
+            "box": [int(v) for v in box],
+            "emotion": emotion_mapping[emotion_idx],
+            "confidence": round(float(probs[emotion_idx]), 4),
+            "probabilities": {emotion_mapping[i]: round(float(p), 4) for i, p in enumerate(probs)},
+        } for box, emotion_idx, probs in zip(faces, detected_emotions, probabilities)],
+    }
+
+def classify_upload_bytes(data):
+    """Detections of uploaded image bytes through the result cache.
+
+    Returns (cache key, CachedResult, decoded image). On a cache hit nothing is
+    decoded and the image is None; for bytes that are not an image the result
+    is None.
+    """
+    key = result_cache.key(data)
+    result = result_cache.get(key)
+    if result is not None:
+        return key, result, None
+    img = decode_image(data)
+    if img is None:
+        return key, None, None
+    return key, result_cache.put(key, img.shape, *classify_image(img)), img
+
+def wants_json():
+    """True when the client asked for detections as JSON (format=json) instead of an annotated JPEG"""
+    return request.values.get('format', 'jpeg') == 'json'
+
+def predict_emotions_from_image(img):
+    """Detect every face in the image, classify all of them in one forward pass and annotate the image"""
+    faces, detected_emotions, _ = classify_image(img)
+    return annotate_faces(img, faces, detected_emotions), detected_emotions
+
+def predict_emotion_from_image(img):
+    """Annotate every face in the image and return the emotion of the first one"""
+    annotated_img, detected_emotions = predict_emotions_from_image(img)
     predicted_emotion = detected_emotions[0] if detected_emotions else None
-    return img, predicted_emotion
+    return annotated_img, predicted_emotion
 
 @app.route('/')
 def home():
@@ -142,7 +236,8 @@ def welcome():
         flash('Please log in first.', 'warning')
         return redirect(url_for('login'))
     session.pop('log_inserted', None)
-    return render_template('welcome.html', username=session['user_name'])
+    live_stream_key()  # the live WebSocket can only use an id already in the cookie
+    return render_template('welcome.html', username=session['user_name'], live_socket=Sock is not None)
 
 @app.route('/admin_dashboard')
 def admin_dashboard():
@@ -197,72 +292,180 @@ def upload_image():
         flash('No file selected.', 'danger')
         return redirect(url_for('welcome'))
     if file:
-        file_stream = file.read()
-        npimg = np.frombuffer(file_stream, np.uint8)
-        img = cv2.imdecode(npimg, cv2.IMREAD_COLOR)
-        if img is None:
+        data = read_upload(file)
+        key, result, img = classify_upload_bytes(data)
+        if result is None:
             flash('Invalid image file.', 'danger')
             return redirect(url_for('welcome'))
-        annotated_img, emotion_id = predict_emotion_from_image(img)
+        detected_emotions = result.ids
+        emotion_id = detected_emotions[0] if detected_emotions else None
         session['predicted_emotion'] = emotion_id
 
         if not session.get('log_inserted'):
-            conn = get_db_connection()
-            user = conn.execute('SELECT email FROM users WHERE id = ?', (session['user_id'],)).fetchone()
-            email = user['email'] if user else 'unknown'
-            emotion_label = emotion_dict.get(emotion_id, 'Unknown Emotion')
-            
             recommendations = recommend_media(emotion_id)
-            music_playlist = recommendations.get('music', []) if recommendations else []
-            podcast_playlist = recommendations.get('podcasts', []) if recommendations else []
-            
-            music_str = ", ".join(
-                [f"{track.get('name', 'Unknown Title')} by {track.get('artist', 'Unknown Artist')}"
-                 for track in music_playlist]
-            ) if music_playlist else "No music"
-            
-            podcast_str = ", ".join(
-                [f"{podcast.get('name', 'Unknown Podcast')} by {podcast.get('publisher', 'Unknown Publisher')}"
-                 for podcast in podcast_playlist]
-            ) if podcast_playlist else "No podcasts"
-            
-            playlist_str = f"Music: {music_str}; Podcasts: {podcast_str}"
-            
-            now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            conn.execute('INSERT INTO logs (email, emotion, datetime, playlist) VALUES (?, ?, ?, ?)', 
-                         (email, emotion_label, now_str, playlist_str))
-            conn.commit()
-            conn.close()
+            log_writer.submit(session['user_id'], emotion_id, int(time.time()),
+                              media_from_recommendations(recommendations))
             session['log_inserted'] = True
 
-        _, buffer = cv2.imencode('.jpg', annotated_img)
-        io_buf = io.BytesIO(buffer)
-        return Response(io_buf.getvalue(), mimetype='image/jpeg')
+        if wants_json():
+            return jsonify(detections_json((result.height, result.width), result.faces, result.ids, result.probabilities))
+
+        jpeg = result.jpeg
+        if jpeg is None:
+            if img is None:
+                # Cache hit without a stored JPEG: decode again, but the model is not involved
+                img = decode_image(data)
+            jpeg = cv2.imencode('.jpg', annotate_faces(img, result.faces, result.ids))[1].tobytes()
+            result_cache.set_jpeg(key, result, jpeg)
+        response = Response(jpeg, mimetype='image/jpeg')
+        # Labels of every detected face, in detection order
+        response.headers['X-Emotions'] = ",".join(emotion_mapping[idx] for idx in detected_emotions)
+        return response
+
+# Live streams follow faces between frames instead of detecting and classifying every frame
+LIVE_TRACKING = os.getenv('LIVE_TRACKING', '1') != '0'
+live_trackers = TrackerPool(lambda: FaceTracker(
+    lambda gray: get_face_detector().detect(gray),
+    lambda gray, boxes: classify_faces(preprocess_faces(gray, boxes, thread_face_buffer())),
+))
+
+# Batch uploads: images are decoded and detected on a thread pool (OpenCV releases the GIL)
+# while their faces meet in the shared inference batches. The detectors are safe to share:
+# HaarDetector keeps a cascade per thread and DnnDetector runs its net under a lock.
+MAX_BATCH_IMAGES = int(os.getenv('MAX_BATCH_IMAGES', '100'))
+MAX_ZIP_BYTES = int(float(os.getenv('MAX_ZIP_UNCOMPRESSED_MB', '200')) * MB)
+upload_executor = ThreadPoolExecutor(max_workers=int(os.getenv('UPLOAD_WORKERS', '4')), thread_name_prefix='upload')
+atexit.register(upload_executor.shutdown, wait=False)
+
+def read_upload_batch(files):
+    """(name, bytes) of every uploaded image, zip archives expanded; ValueError past the batch limits"""
+    images = []
+    for file in files:
+        is_zip = file.filename.lower().endswith('.zip')
+        data = read_upload(file, MAX_ZIP_BYTES if is_zip else MAX_IMAGE_BYTES)
+        if is_zip or data[:4] == b'PK\x03\x04':
+            with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                members = [info for info in archive.infolist()
+                           if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS)
+                           and not info.filename.startswith('__MACOSX/')]
+                # Sizes come from the archive headers; zipfile refuses to read past them
+                if sum(info.file_size for info in members) > MAX_ZIP_BYTES:
+                    raise ValueError("Zip archive is too large once extracted.")
+                if any(info.file_size > MAX_IMAGE_BYTES for info in members):
+                    raise ImageTooLarge(f"Images must be smaller than {MAX_IMAGE_BYTES / MB:g} MB.")
+                if len(images) + len(members) > MAX_BATCH_IMAGES:
+                    raise ValueError(f"At most {MAX_BATCH_IMAGES} images per request.")
+                images.extend((info.filename, archive.read(info)) for info in members)
+        else:
+            images.append((file.filename, data))
+        if len(images) > MAX_BATCH_IMAGES:
+            raise ValueError(f"At most {MAX_BATCH_IMAGES} images per request.")
+    return images
+
+def classify_upload(name, data):
+    """Detections of one image of a batch upload, as a JSON-ready dict"""
+    try:
+        _, result, _ = classify_upload_bytes(data)
+    except ImageTooLarge as e:
+        return {"name": name, "error": str(e)}
+    if result is None:
+        return {"name": name, "error": "Invalid image file."}
+    return {"name": name, **detections_json((result.height, result.width), result.faces, result.ids, result.probabilities)}
+
+@app.route('/upload_images', methods=['POST'])
+def upload_images():
+    """Classify many images (files and/or zip archives) in one request.
+
+    Returns a JSON array with one entry per image, in upload order, or with
+    stream=1 (or Accept: application/x-ndjson) one JSON line per image as soon
+    as it is done.
+    """
+    request.max_content_length = MAX_BATCH_REQUEST_BYTES
+    if 'user_id' not in session:
+        return jsonify({"error": "Please log in first."}), 401
+    files = request.files.getlist('files') + request.files.getlist('file')
+    if not files:
+        return jsonify({"error": "No files in request."}), 400
+    try:
+        images = read_upload_batch(files)
+    except ImageTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    except (ValueError, zipfile.BadZipFile) as e:
+        return jsonify({"error": str(e)}), 400
+    if not images:
+        return jsonify({"error": "No images found in request."}), 400
+
+    futures = {upload_executor.submit(classify_upload, name, data): index
+               for index, (name, data) in enumerate(images)}
+    if request.args.get('stream') == '1' or request.accept_mimetypes.best == 'application/x-ndjson':
+        def generate():
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {"name": images[futures[future]][0], "error": str(e)}
+                yield json.dumps({"index": futures[future], **result}) + "\n"
+        return Response(generate(), mimetype='application/x-ndjson')
+    results = [None] * len(images)
+    for future, index in futures.items():
+        results[index] = {"index": index, **future.result()}
+    return jsonify(results)
+
+def live_stream_key(stream_id=None):
+    """Store key of a live stream: the client's stream id, scoped to this browser session"""
+    if 'live_id' not in session:
+        session['live_id'] = uuid.uuid4().hex
+    return f"{session['live_id']}:{stream_id or 'default'}"
+
+def process_live_frame(frame_bytes, stream_key, as_json=False):
+    """Classify one live frame and count it in the live session.
+
+    Returns the annotated JPEG bytes, or with as_json the detections as a JSON
+    string (no drawing or re-encoding); None if the frame cannot be decoded.
+    """
+    frame = decode_image(frame_bytes)
+    if frame is None:
+        return None
+    if LIVE_TRACKING:
+        faces, detected_emotions, probabilities = live_trackers.get(stream_key).update(
+            cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+    else:
+        faces, detected_emotions, probabilities = classify_image(frame)
+    # Counted server-side: the cookie session is only written once, when the stream key is created
+    live_store.record(stream_key,
+                      detected_emotions[0] if detected_emotions else None,
+                      float(probabilities[0][detected_emotions[0]]) if detected_emotions else None)
+    if as_json:
+        return json.dumps(detections_json(frame.shape, faces, detected_emotions, probabilities), separators=(',', ':'))
+    _, buffer = cv2.imencode('.jpg', annotate_faces(frame, faces, detected_emotions))
+    return buffer.tobytes()
 
 @app.route('/live_webcam', methods=['POST'])
 def live_webcam():
     if 'frame' not in request.files:
         return Response("No frame data", status=400)
     
-    frame_file = request.files['frame']
-    frame_stream = frame_file.read()
-    npimg = np.frombuffer(frame_stream, np.uint8)
-    frame = cv2.imdecode(npimg, cv2.IMREAD_COLOR)
-    
-    if frame is None:
+    as_json = wants_json()
+    result = process_live_frame(read_upload(request.files['frame']), live_stream_key(request.form.get('stream_id')), as_json)
+    if result is None:
         return Response("Invalid frame data", status=400)
-    
-    annotated_frame, emotion_id = predict_emotion_from_image(frame)
-    
-    if 'emotion_counts' not in session:
-        session['emotion_counts'] = {str(k): 0 for k in range(7)}
-    
-    if emotion_id is not None:
-        session['emotion_counts'][str(emotion_id)] += 1
-        session.modified = True
-    
-    _, buffer = cv2.imencode('.jpg', annotated_frame)
-    return Response(buffer.tobytes(), mimetype='image/jpeg')
+    return Response(result, mimetype='application/json' if as_json else 'image/jpeg')
+
+if Sock is not None:
+    # simple_websocket closes the connection on larger messages instead of buffering them
+    app.config.setdefault('SOCK_SERVER_OPTIONS', {'max_message_size': MAX_IMAGE_BYTES})
+    sock = Sock(app)
+
+    @sock.route('/ws/live')
+    def live_socket(ws):
+        """Persistent live stream: binary JPEG frames in, annotated JPEG frames (or JSON text
+        with format=json) out, stale frames dropped"""
+        if 'live_id' not in session:
+            # The stream key must already be in the cookie; the handshake cannot set it
+            return
+        stream_key = live_stream_key(request.args.get('stream_id'))
+        as_json = wants_json()
+        serve_frames(ws, lambda data: process_live_frame(data, stream_key, as_json), max_size=MAX_IMAGE_BYTES)
 
 @app.route('/recommend_media')
 def recommend_media_route():
@@ -276,11 +479,11 @@ def recommend_media_route():
 
 @app.route('/live_summary')
 def live_summary():
-    emotion_counts = session.get('emotion_counts')
-    if not emotion_counts:
+    live = live_store.get(live_stream_key(request.args.get('stream_id')))
+    if not live or not any(live['counts'].values()):
         return jsonify({"error": "No emotion data available."}), 400
 
-    emotion_counts_int = {int(k): v for k, v in emotion_counts.items()}
+    emotion_counts_int = live['counts']
     highest_emotion_index = max(emotion_counts_int, key=emotion_counts_int.get)
     highest_emotion_label = emotion_dict.get(highest_emotion_index, "Unknown")
     
@@ -288,34 +491,17 @@ def live_summary():
     music_tracks = recommendations.get('music', []) if recommendations else []
     podcasts = recommendations.get('podcasts', []) if recommendations else []
     
-    music_str = ", ".join(
-        [f"{track.get('name', 'Unknown Title')} by {track.get('artist', 'Unknown Artist')}"
-         for track in music_tracks]
-    ) if music_tracks else "No music"
-    
-    podcast_str = ", ".join(
-        [f"{podcast.get('name', 'Unknown Podcast')} by {podcast.get('publisher', 'Unknown Publisher')}"
-         for podcast in podcasts]
-    ) if podcasts else "No podcasts"
-    
-    playlist_str = f"Music: {music_str}; Podcasts: {podcast_str}"
-    
-    conn = get_db_connection()
-    user = conn.execute('SELECT email FROM users WHERE id = ?', (session.get('user_id'),)).fetchone()
-    email = user['email'] if user else 'unknown'
-    now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    conn.execute(
-        'INSERT INTO logs (email, emotion, datetime, playlist) VALUES (?, ?, ?, ?)',
-        (email, highest_emotion_label, now_str, playlist_str)
-    )
-    conn.commit()
-    conn.close()
+    log_writer.submit(session.get('user_id'), highest_emotion_index, int(time.time()),
+                      media_from_recommendations(recommendations))
     
     return jsonify({
         "emotion_counts": {emotion_dict[k]: v for k, v in emotion_counts_int.items()},
         "highest_emotion": highest_emotion_label,
         "music": music_tracks[:10],
-        "podcasts": podcasts[:5]
+        "podcasts": podcasts[:5],
+        "frames": live['frames'],
+        "timeline": [{"t": ts, "emotion": emotion_dict.get(idx) if idx is not None else None, "confidence": confidence}
+                     for ts, idx, confidence in live['series']]
     })
 
 def init_feedback_db():
@@ -328,8 +514,6 @@ def init_feedback_db():
     conn.commit()
     conn.close()
 
-init_feedback_db()
-
 @app.route('/feedback', methods=['GET', 'POST'])
 def feedback():
     if 'user_id' not in session:
@@ -377,31 +561,167 @@ def feedback():
     
     return render_template('feedback.html')
 
-def init_logs_db():
+def init_logs_db(migrate=False):
+    """Create the logs schema; with migrate also convert a legacy logs table and backfill the rollups.
+
+    Both can take a while on a large users.db, so only startup (init_databases)
+    passes migrate; requests just warn.
+    """
     conn = get_db_connection()
-    conn.execute('''CREATE TABLE IF NOT EXISTS logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    email TEXT NOT NULL,
-                    emotion TEXT,
-                    datetime TEXT,
-                    playlist TEXT
-                )''')
+    if has_legacy_logs(conn):
+        if migrate:
+            print("Migrating the legacy logs table to the normalized schema (see migrate_logs.py)...")
+            report_migration(*migrate_legacy_logs(conn))
+        else:
+            print("❌ users.db still has the legacy logs table: run python migrate_logs.py or flask --app app init-db")
+    create_log_schema(conn)
+    if rollups_need_rebuild(conn):
+        if migrate:
+            print("Backfilling the emotion analytics rollups from existing logs...")
+            rebuild_rollups(conn)
+        else:
+            print("❌ The analytics rollups are empty: run python migrate_logs.py or flask --app app init-db")
     conn.commit()
     conn.close()
 
-init_logs_db()
+_db_initialized = False
+_db_init_lock = threading.Lock()
+
+def init_databases():
+    """Create every table and run pending migrations; called at startup, not on a request"""
+    global _db_initialized
+    with _db_init_lock:
+        init_db()
+        init_feedback_db()
+        init_logs_db(migrate=True)
+        _db_initialized = True
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create the tables, migrate legacy logs and backfill the analytics rollups"""
+    init_databases()
+
+@app.before_request
+def ensure_db_initialized():
+    """Create missing tables on the first request when the app was not started through init_databases"""
+    global _db_initialized
+    if _db_initialized:
+        return
+    with _db_init_lock:
+        if not _db_initialized:
+            init_db()
+            init_feedback_db()
+            init_logs_db()
+            _db_initialized = True
+
+@app.errorhandler(ModelNotAvailable)
+def model_not_available(e):
+    return Response(str(e), status=503)
+
+@app.errorhandler(TimeoutError)
+def inference_timeout(e):
+    return Response("Emotion model is busy, please try again.", status=503)
+
+@app.errorhandler(ImageTooLarge)
+def image_too_large(e):
+    return Response(str(e), status=413)
+
+@app.errorhandler(413)
+def request_too_large(e):
+    return Response(f"Upload larger than {request.max_content_length / MB:g} MB.", status=413)
+
+def _logs_page():
+    """Filtered page of logs for the current user (admins may see everyone's), with the next cursor"""
+    if session.get('admin'):
+        user_id, email = None, request.args.get('email') or None
+    else:
+        user_id, email = session['user_id'], None
+    conn = get_db_connection()
+    try:
+        return query_logs(
+            conn,
+            user_id=user_id,
+            email=email,
+            emotion=request.args.get('emotion') or None,
+            start=request.args.get('start'),
+            end=request.args.get('end'),
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', DEFAULT_PAGE_SIZE, type=int),
+        )
+    finally:
+        conn.close()
 
 @app.route('/logs')
 def view_logs():
-    if 'user_id' not in session:
+    if 'user_id' not in session and not session.get('admin'):
         flash('Please log in to view logs.', 'warning')
         return redirect(url_for('login'))
     
-    conn = get_db_connection()
-    logs = conn.execute('SELECT * FROM logs').fetchall()
-    conn.close()
+    try:
+        logs, next_cursor = _logs_page()
+    except ValueError as e:
+        flash(str(e), 'danger')
+        logs, next_cursor = [], None
     
-    return render_template('logs.html', logs=logs)
+    next_args = dict(request.args, cursor=next_cursor) if next_cursor else None
+    return render_template('logs.html', logs=logs, next_args=next_args, filters=request.args)
+
+@app.route('/api/logs')
+def api_logs():
+    if 'user_id' not in session and not session.get('admin'):
+        return jsonify({"error": "Please log in to view logs."}), 401
+    try:
+        logs, next_cursor = _logs_page()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"logs": [dict(log) for log in logs], "next_cursor": next_cursor})
+
+def _analytics_filters():
+    """user_id, start and end (UTC, like the rollup buckets) for the analytics endpoints; None user_id means all users"""
+    user_id = request.args.get('user_id', type=int)
+    email = request.args.get('email')
+    if email:
+        conn = get_db_connection()
+        row = conn.execute('SELECT id FROM users WHERE email = ?', (email,)).fetchone()
+        conn.close()
+        if row is None:
+            raise ValueError(f"Unknown user: {email}")
+        user_id = row['id']
+    return (user_id,
+            parse_date_bound(request.args.get('start'), utc=True),
+            parse_date_bound(request.args.get('end'), end=True, utc=True))
+
+@app.route('/admin/analytics')
+def admin_analytics():
+    if not session.get('admin'):
+        flash('Unauthorized access. Admins only.', 'danger')
+        return redirect(url_for('login'))
+    return render_template('admin_analytics.html', filters=request.args)
+
+@app.route('/admin/analytics/<granularity>')
+def admin_analytics_data(granularity):
+    if not session.get('admin'):
+        return jsonify({"error": "Admins only."}), 403
+    if granularity not in GRANULARITIES:
+        return jsonify({"error": f"Unknown granularity: {granularity}"}), 404
+    try:
+        user_id, start, end = _analytics_filters()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    conn = get_db_connection()
+    try:
+        buckets = emotion_distribution(conn, granularity, user_id=user_id, start=start, end=end)
+    finally:
+        conn.close()
+    return jsonify({"granularity": granularity, "user_id": user_id,
+                    "totals": emotion_totals(buckets), "buckets": buckets})
+
+@app.route('/admin/result_cache')
+def admin_result_cache():
+    if not session.get('admin'):
+        return jsonify({"error": "Admins only."}), 403
+    return jsonify(result_cache.stats())
+
 @app.route('/admin', methods=['GET', 'POST'])
 def admin():
     if request.method == 'POST':
@@ -445,7 +765,7 @@ def delete_user_by_id(user_id):
         flash('Unauthorized access. Admins only.', 'danger')
         return redirect(url_for('login'))
     
-    conn = sqlite3.connect('users.db')
+    conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute("DELETE FROM users WHERE id = ?", (user_id,))
     conn.commit()
@@ -455,4 +775,5 @@ def delete_user_by_id(user_id):
     return redirect(url_for('delete_user'))
 
 if __name__ == '__main__':
+    init_databases()
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,310 @@
+"""Offline emotion classification of large image collections, without the web app.
+
+Usage:
+    python batch_classify.py --input archive/ --output emotions.csv
+    python batch_classify.py --manifest photos.txt --output emotions.jsonl --workers 8 --batch-size 64
+    python batch_classify.py --input archive/ --output emotions_parquet/ --format parquet
+
+Worker processes decode each image, detect faces and resize the crops (the
+same detector and preprocessing as the app, see model_registry.py for the
+EMOTION_* / FACE_DETECTOR_* settings). The main process packs crops from many
+images into full model batches and streams one row per face (or one row for
+an image without faces or that failed to decode) to the output.
+
+Finished images are appended to <output>.checkpoint after their rows are
+written, so an interrupted run resumes where it stopped when started again
+with the same output (at most the last batch is written twice). Use
+--restart to start over.
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import queue
+import time
+
+import cv2
+import numpy as np
+
+from face_detector import detector_kwargs, load_detector
+from face_pipeline import IMAGE_EXTENSIONS, IMG_SIZE, emotion_mapping
+from model_registry import ModelRegistry
+
+LABELS = [emotion_mapping[idx] for idx in sorted(emotion_mapping)]
+COLUMNS = ["path", "face", "x", "y", "w", "h", "emotion", "confidence", "error"] + [f"p_{label}" for label in LABELS]
+
+
+def iter_paths(input_dir=None, manifest=None):
+    """Image paths from a directory tree (sorted) or a manifest (one path per line, or a CSV with a path column)"""
+    if manifest:
+        base = os.path.dirname(os.path.abspath(manifest))
+        with open(manifest, newline="", encoding="utf-8") as f:
+            if manifest.lower().endswith(".csv"):
+                names = (row["path"] for row in csv.DictReader(f))
+            else:
+                names = (line.strip() for line in f if line.strip() and not line.startswith("#"))
+            for name in names:
+                yield name if os.path.isabs(name) else os.path.join(base, name)
+        return
+    for root, dirs, files in os.walk(input_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.join(root, name)
+
+
+_detector = None
+
+
+def _init_worker(detector_name, kwargs):
+    global _detector
+    cv2.setNumThreads(1)  # parallelism comes from the process pool
+    _detector = load_detector(detector_name, **kwargs)
+
+
+def load_faces(path):
+    """Decode and detect one image; returns (path, boxes, (N, IMG_SIZE, IMG_SIZE) uint8 crops, error)"""
+    try:
+        gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    except cv2.error as e:
+        return path, None, None, str(e)
+    if gray is None:
+        return path, None, None, "unreadable image"
+    boxes = _detector.detect(gray)
+    crops = np.empty((len(boxes), IMG_SIZE, IMG_SIZE), dtype=np.uint8)
+    for i, (x, y, w, h) in enumerate(boxes):
+        cv2.resize(gray[y:y+h, x:x+w], (IMG_SIZE, IMG_SIZE), dst=crops[i])
+    return path, boxes, crops, None
+
+
+class CsvOutput:
+    def __init__(self, path, append):
+        write_header = not (append and os.path.exists(path) and os.path.getsize(path))
+        self.file = open(path, "a" if append else "w", newline="", encoding="utf-8")
+        self.writer = csv.DictWriter(self.file, fieldnames=COLUMNS)
+        if write_header:
+            self.writer.writeheader()
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class JsonlOutput:
+    def __init__(self, path, append):
+        self.file = open(path, "a" if append else "w", encoding="utf-8")
+
+    def write(self, rows):
+        self.file.writelines(json.dumps(row, separators=(",", ":")) + "\n" for row in rows)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetOutput:
+    """A directory of part-NNNNN.parquet files, one per flush, so resuming just adds parts"""
+
+    def __init__(self, path, append):
+        import pyarrow
+        import pyarrow.parquet
+        self.pa, self.pq = pyarrow, pyarrow.parquet
+        os.makedirs(path, exist_ok=True)
+        parts = sorted(name for name in os.listdir(path) if name.startswith("part-") and name.endswith(".parquet"))
+        if not append:
+            for name in parts:
+                os.remove(os.path.join(path, name))
+            parts = []
+        self.path = path
+        self.part = len(parts)
+        # Explicit types, so parts whose columns happen to be all empty still share one schema
+        types = {"path": pyarrow.string(), "emotion": pyarrow.string(), "error": pyarrow.string()}
+        for name in ("face", "x", "y", "w", "h"):
+            types[name] = pyarrow.int64()
+        self.schema = pyarrow.schema([(name, types.get(name, pyarrow.float64())) for name in COLUMNS])
+
+    def write(self, rows):
+        if not rows:
+            return
+        table = self.pa.Table.from_pylist(rows, schema=self.schema)
+        self.pq.write_table(table, os.path.join(self.path, f"part-{self.part:05d}.parquet"))
+        self.part += 1
+
+    def close(self):
+        pass
+
+
+OUTPUTS = {"csv": CsvOutput, "jsonl": JsonlOutput, "parquet": ParquetOutput}
+
+
+def output_format(path, fmt=None):
+    if fmt:
+        return fmt
+    ext = os.path.splitext(path)[1].lower().lstrip(".")
+    return {"csv": "csv", "jsonl": "jsonl", "json": "jsonl", "parquet": "parquet"}.get(ext, "parquet" if not ext else "csv")
+
+
+def _rows(path, boxes, probabilities, error):
+    if error or not len(boxes):
+        return [{**dict.fromkeys(COLUMNS), "path": path, "error": error}]
+    rows = []
+    for i, ((x, y, w, h), probs) in enumerate(zip(boxes, probabilities)):
+        top = int(np.argmax(probs))
+        row = {"path": path, "face": i, "x": int(x), "y": int(y), "w": int(w), "h": int(h),
+               "emotion": emotion_mapping[top], "confidence": round(float(probs[top]), 4), "error": None}
+        row.update({f"p_{label}": round(float(p), 4) for label, p in zip(LABELS, probs)})
+        rows.append(row)
+    return rows
+
+
+class BatchClassifier:
+    """Packs face crops from many images into model batches and writes finished images out"""
+
+    def __init__(self, predict_fn, output, checkpoint_file, batch_size=64):
+        self.predict_fn = predict_fn
+        self.output = output
+        self.checkpoint_file = checkpoint_file
+        self.batch_size = batch_size
+        self._batch = np.empty((batch_size, IMG_SIZE, IMG_SIZE, 3), dtype=np.float32)
+        self._pending = []
+        self._faces = 0
+        self.images = 0
+        self.faces = 0
+
+    def add(self, path, boxes, crops, error):
+        self._pending.append((path, boxes, crops, error))
+        self._faces += 0 if crops is None else len(crops)
+        # Also flush on image count, so runs of faceless images still reach the checkpoint
+        if self._faces >= self.batch_size or len(self._pending) >= 4 * self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        crops = [c for _, _, c, _ in self._pending if c is not None and len(c)]
+        probabilities = np.empty((0, len(LABELS)), dtype=np.float32)
+        if crops:
+            crops = np.concatenate(crops)
+            outputs = []
+            for start in range(0, len(crops), self.batch_size):
+                chunk = crops[start:start + self.batch_size]
+                batch = self._batch[:len(chunk)]
+                # Same normalisation as face_pipeline.preprocess_faces, gray broadcast to 3 channels
+                np.divide(chunk[:, :, :, np.newaxis], np.float32(255.0), out=batch)
+                outputs.append(np.asarray(self.predict_fn(batch)))
+            probabilities = np.concatenate(outputs)
+        rows, offset = [], 0
+        for path, boxes, c, error in self._pending:
+            count = 0 if c is None else len(c)
+            rows.extend(_rows(path, boxes, probabilities[offset:offset + count], error))
+            offset += count
+        self.output.write(rows)
+        self.checkpoint_file.writelines(path + "\n" for path, _, _, _ in self._pending)
+        self.checkpoint_file.flush()
+        os.fsync(self.checkpoint_file.fileno())
+        self.images += len(self._pending)
+        self.faces += offset
+        self._pending, self._faces = [], 0
+
+
+def read_checkpoint(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        return {line.rstrip("\n") for line in f if line.endswith("\n")}
+
+
+def _bounded_results(pool, paths, window):
+    """load_faces results from the pool in completion order, with at most window images in flight.
+
+    Decoded crops only pile up to the window size when inference is slower
+    than the workers, instead of for the whole collection.
+    """
+    done = queue.Queue()
+    in_flight = 0
+    for path in paths:
+        while in_flight >= window:
+            in_flight -= 1
+            yield _result(done.get())
+        pool.apply_async(load_faces, (path,), callback=done.put, error_callback=done.put)
+        in_flight += 1
+    for _ in range(in_flight):
+        yield _result(done.get())
+
+
+def _result(item):
+    if isinstance(item, BaseException):
+        raise item
+    return item
+
+
+def run(paths, output_path, predict_fn, detector_name, detector_args, fmt=None, workers=None,
+        batch_size=64, restart=False, progress_every=1000, max_in_flight=None):
+    """Classify every path not yet in the checkpoint; returns (images, faces) processed in this run.
+
+    max_in_flight bounds the images submitted to the workers but not yet
+    consumed (default: two model batches, at least 8 per worker).
+    """
+    checkpoint_path = output_path.rstrip("/\\") + ".checkpoint"
+    if restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    done = read_checkpoint(checkpoint_path)
+    todo = (path for path in paths if path not in done)
+    output = OUTPUTS[output_format(output_path, fmt)](output_path, append=bool(done))
+    started = time.perf_counter()
+    with open(checkpoint_path, "a", encoding="utf-8") as checkpoint_file:
+        classifier = BatchClassifier(predict_fn, output, checkpoint_file, batch_size)
+        if workers == 0:
+            _init_worker(detector_name, detector_args)
+            results = map(load_faces, todo)
+            pool = None
+        else:
+            pool = multiprocessing.Pool(workers, initializer=_init_worker, initargs=(detector_name, detector_args))
+            window = max_in_flight or max(2 * batch_size, 8 * (workers or os.cpu_count() or 1))
+            results = _bounded_results(pool, todo, window)
+        try:
+            # images grows in flush-sized steps, so report on crossing a threshold rather than on a multiple
+            next_report = progress_every
+            for result in results:
+                classifier.add(*result)
+                if progress_every and classifier.images >= next_report:
+                    rate = classifier.images / (time.perf_counter() - started)
+                    print(f"   {classifier.images} images, {classifier.faces} faces ({rate:.1f} images/s)")
+                    next_report += progress_every * ((classifier.images - next_report) // progress_every + 1)
+            classifier.flush()
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+            output.close()
+    return classifier.images, classifier.faces
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Classify the emotions of every face in a collection of images")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input", help="Directory to walk for images")
+    source.add_argument("--manifest", help="File with one image path per line (or a CSV with a path column)")
+    parser.add_argument("--output", required=True, help="Output .csv / .jsonl file, or a directory for parquet")
+    parser.add_argument("--format", choices=sorted(OUTPUTS), default=None, help="Defaults to the output extension")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Decode/detect processes (0 = in-process)")
+    parser.add_argument("--batch-size", type=int, default=64, help="Faces per model call")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start over")
+    args = parser.parse_args(argv)
+
+    registry = ModelRegistry()
+    model = registry.get_model()
+    images, faces = run(
+        iter_paths(args.input, args.manifest), args.output, model.predict,
+        registry.config["face_detector"], detector_kwargs(registry.config),
+        fmt=args.format, workers=args.workers, batch_size=args.batch_size, restart=args.restart,
+    )
+    print(f"✅ Classified {faces} faces in {images} images -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
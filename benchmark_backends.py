@@ -0,0 +1,143 @@
+"""Accuracy-vs-latency comparison of the inference backends against the Keras baseline.
+
+Usage:
+    python benchmark_backends.py --images bench_images/ --model model.h5
+    python benchmark_backends.py --images bench_images/ --candidate onnx:model_int8.onnx --report report.md
+
+Faces are detected once in every image of the fixed image set and the same face
+batch is fed to every backend. If images live in sub-directories named after an
+emotion (bench_images/happy/*.jpg) accuracy against those labels is reported too;
+agreement with the Keras predictions is always reported.
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+import cv2
+import numpy as np
+
+from face_pipeline import IMAGE_EXTENSIONS, detect_faces, emotion_mapping, load_face_cascade, preprocess_faces
+from inference_backends import EXPORTED_MODEL_FILES, default_model_path, load_backend
+
+
+def load_face_set(image_dir):
+    """Detect and preprocess every face of the image set, returns (faces, labels)"""
+    label_ids = {label: idx for idx, label in emotion_mapping.items()}
+    face_cascade = load_face_cascade()
+    batches, labels = [], []
+    for root, _, files in os.walk(image_dir):
+        for name in sorted(files):
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            img = cv2.imread(os.path.join(root, name))
+            if img is None:
+                continue
+            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            faces = detect_faces(gray, face_cascade)
+            if len(faces) == 0:
+                continue
+            batches.append(preprocess_faces(gray, faces))
+            labels.extend([label_ids.get(os.path.basename(root))] * len(faces))
+    if not batches:
+        return np.empty((0,)), []
+    return np.concatenate(batches), labels
+
+
+def time_backend(backend, faces, batch_size, repeats):
+    """Run the face set through a backend, returns (predictions, per-batch latencies in ms)"""
+    backend.predict(faces[:batch_size])  # warm-up
+    latencies = []
+    predictions = None
+    for _ in range(repeats):
+        outputs = []
+        for start in range(0, len(faces), batch_size):
+            t0 = time.perf_counter()
+            outputs.append(np.asarray(backend.predict(faces[start:start + batch_size])))
+            latencies.append((time.perf_counter() - t0) * 1000)
+        predictions = np.concatenate(outputs)
+    return predictions, latencies
+
+
+def summarize(name, model_path, load_s, predictions, latencies, baseline, labels, faces, repeats):
+    top1 = predictions.argmax(axis=1)
+    known = [(i, label) for i, label in enumerate(labels) if label is not None]
+    row = {
+        "backend": name,
+        "model": os.path.basename(model_path),
+        "size_mb": round(os.path.getsize(model_path) / 1e6, 2),
+        "load_s": round(load_s, 2),
+        "median_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+        "faces_per_s": round(len(faces) * repeats / (sum(latencies) / 1000), 1),
+        "agreement": round(float((top1 == baseline.argmax(axis=1)).mean()), 4),
+        "max_abs_diff": round(float(np.abs(predictions - baseline).max()), 4),
+        "accuracy": None,
+    }
+    if known:
+        row["accuracy"] = round(sum(top1[i] == label for i, label in known) / len(known), 4)
+    return row
+
+
+def write_report(rows, path, face_count):
+    columns = ["backend", "model", "size_mb", "load_s", "median_ms", "p95_ms", "faces_per_s", "agreement", "max_abs_diff", "accuracy"]
+    lines = [
+        f"# Inference backend comparison ({face_count} faces)",
+        "",
+        "| " + " | ".join(columns) + " |",
+        "|" + "---|" * len(columns),
+    ]
+    for row in rows:
+        lines.append("| " + " | ".join("-" if row[c] is None else str(row[c]) for c in columns) + " |")
+    report = "\n".join(lines) + "\n"
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(report)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare inference backends against the Keras baseline")
+    parser.add_argument("--images", required=True, help="Directory with the fixed benchmark image set")
+    parser.add_argument("--model", default=os.getenv("EMOTION_KERAS_MODEL", "model.h5"), help="Keras baseline model.h5")
+    parser.add_argument("--candidate", action="append", default=[], metavar="BACKEND:PATH",
+                        help="Backend to compare, e.g. onnx:model.onnx (defaults to every exported model found)")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--report", default="backend_report.md", help="Markdown report path")
+    parser.add_argument("--json", default=None, help="Also write the raw results as JSON")
+    args = parser.parse_args(argv)
+
+    faces, labels = load_face_set(args.images)
+    if len(faces) == 0:
+        parser.error(f"No faces found in {args.images}")
+
+    candidates = [tuple(c.split(":", 1)) for c in args.candidate]
+    if not candidates:
+        for (backend, variant) in EXPORTED_MODEL_FILES:
+            path = default_model_path(backend, args.model, variant)
+            if os.path.exists(path):
+                candidates.append((backend, path))
+
+    rows = []
+    baseline = None
+    for name, path in [("keras", args.model)] + candidates:
+        t0 = time.perf_counter()
+        backend = load_backend(name, path, num_threads=args.threads)
+        load_s = time.perf_counter() - t0
+        predictions, latencies = time_backend(backend, faces, args.batch_size, args.repeats)
+        if baseline is None:
+            baseline = predictions
+        rows.append(summarize(name, path, load_s, predictions, latencies, baseline, labels, faces, args.repeats))
+        print(f"✅ {name} ({os.path.basename(path)}): median {rows[-1]['median_ms']} ms/batch")
+
+    print(write_report(rows, args.report, len(faces)))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
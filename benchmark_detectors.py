@@ -0,0 +1,134 @@
+"""Speed and recall comparison of the face detectors on a fixed image set.
+
+Usage:
+    python benchmark_detectors.py --images bench_images/
+    python benchmark_detectors.py --images bench_images/ --candidate haar:max_side=640 \\
+        --candidate dnn:model_path=res10_300x300_ssd_iter_140000.caffemodel,config_path=deploy.prototxt
+
+Candidates are NAME[:key=value,...] with the constructor arguments of the
+detector classes in face_detector.py. Recall is measured against the boxes of
+the reference detector (full-resolution Haar by default): a reference face
+counts as found when a candidate box overlaps it with IoU >= --iou.
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+import cv2
+import numpy as np
+
+from face_detector import load_detector
+from face_pipeline import IMAGE_EXTENSIONS
+from face_tracker import iou
+
+DEFAULT_CANDIDATES = ["haar:max_side=1280", "haar:max_side=800", "haar:max_side=640", "haar:max_side=640,scale_factor=1.2"]
+
+
+def parse_spec(spec):
+    """'haar:max_side=640,scale_factor=1.2' -> ('haar', {'max_side': 640, 'scale_factor': 1.2})"""
+    name, _, args = spec.partition(":")
+    kwargs = {}
+    for pair in filter(None, args.split(",")):
+        key, _, value = pair.partition("=")
+        for cast in (int, float):
+            try:
+                value = cast(value)
+                break
+            except ValueError:
+                continue
+        kwargs[key] = value
+    return name, kwargs
+
+
+def load_images(image_dir):
+    images = []
+    for root, _, files in os.walk(image_dir):
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                img = cv2.imread(os.path.join(root, name), cv2.IMREAD_GRAYSCALE)
+                if img is not None:
+                    images.append(img)
+    return images
+
+
+def run_detector(detector, images, repeats):
+    """Detect on every image, returns (boxes per image, per-image latencies in ms)"""
+    detector.detect(images[0])  # warm-up
+    latencies, boxes = [], []
+    for _ in range(repeats):
+        boxes = []
+        for img in images:
+            t0 = time.perf_counter()
+            boxes.append(detector.detect(img))
+            latencies.append((time.perf_counter() - t0) * 1000)
+    return boxes, latencies
+
+
+def recall(reference, candidate, threshold):
+    found = total = 0
+    for ref_boxes, cand_boxes in zip(reference, candidate):
+        total += len(ref_boxes)
+        found += sum(any(iou(tuple(ref), tuple(cand)) >= threshold for cand in cand_boxes) for ref in ref_boxes)
+    return round(found / total, 4) if total else None
+
+
+def write_report(rows, path, image_count, reference):
+    columns = ["detector", "median_ms", "p95_ms", "images_per_s", "faces", "recall"]
+    lines = [
+        f"# Face detector comparison ({image_count} images, recall vs {reference})",
+        "",
+        "| " + " | ".join(columns) + " |",
+        "|" + "---|" * len(columns),
+    ]
+    for row in rows:
+        lines.append("| " + " | ".join("-" if row[c] is None else str(row[c]) for c in columns) + " |")
+    report = "\n".join(lines) + "\n"
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(report)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare face detectors against a reference detector")
+    parser.add_argument("--images", required=True, help="Directory with the fixed benchmark image set")
+    parser.add_argument("--reference", default="haar:max_side=0", help="Detector whose boxes count as ground truth")
+    parser.add_argument("--candidate", action="append", default=[], metavar="NAME[:key=value,...]",
+                        help="Detector to compare (defaults to a few Haar downscale settings)")
+    parser.add_argument("--iou", type=float, default=0.5, help="Overlap needed to count a reference face as found")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--report", default="detector_report.md", help="Markdown report path")
+    parser.add_argument("--json", default=None, help="Also write the raw results as JSON")
+    args = parser.parse_args(argv)
+
+    images = load_images(args.images)
+    if not images:
+        parser.error(f"No images found in {args.images}")
+
+    rows = []
+    reference_boxes = None
+    for spec in [args.reference] + (args.candidate or DEFAULT_CANDIDATES):
+        name, kwargs = parse_spec(spec)
+        boxes, latencies = run_detector(load_detector(name, **kwargs), images, args.repeats)
+        if reference_boxes is None:
+            reference_boxes = boxes
+        rows.append({
+            "detector": spec,
+            "median_ms": round(statistics.median(latencies), 2),
+            "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+            "images_per_s": round(len(latencies) / (sum(latencies) / 1000), 1),
+            "faces": int(sum(len(b) for b in boxes)),
+            "recall": recall(reference_boxes, boxes, args.iou),
+        })
+        print(f"✅ {spec}: median {rows[-1]['median_ms']} ms/image, recall {rows[-1]['recall']}")
+
+    print(write_report(rows, args.report, len(images), args.reference))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,11 @@ import unittest
 import os
 import io
 import sqlite3
+import json
+import zipfile
 from app import app, init_db, get_db_connection
+from emotion_logs import insert_logs
+from datetime import datetime
 from PIL import Image
 import numpy as np
 
@@ -29,6 +33,14 @@ class BlackBoxTest(unittest.TestCase):
         # Cleanup: Delete only test records (using the "TEST_" prefix)
         conn = get_db_connection()
         cursor = conn.cursor()
+        try:
+            cursor.execute("DELETE FROM emotion_logs WHERE user_id IN "
+                           "(SELECT id FROM users WHERE name LIKE 'TEST_%' OR email LIKE 'TEST_%')")
+            for table in ("emotion_rollup_hourly", "emotion_rollup_daily"):
+                cursor.execute(f"DELETE FROM {table} WHERE user_id IN "
+                               "(SELECT id FROM users WHERE name LIKE 'TEST_%' OR email LIKE 'TEST_%')")
+        except sqlite3.OperationalError:
+            pass
         try:
             cursor.execute("DELETE FROM users WHERE name LIKE 'TEST_%' OR email LIKE 'TEST_%'")
         except Exception as e:
@@ -262,5 +274,112 @@ class BlackBoxTest(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         # self.assertIn(b'<table', response.data)  # Assuming logs.html contains a table of logs
 
+    def test_logs_api_keyset_pagination(self):
+        # TC-B22: /api/logs returns only the user's own logs, newest first, page by page.
+        self.app.post('/signup', data={
+            'name': 'TEST_PageUser',
+            'email': 'TEST_pageuser@example.com',
+            'password': '12345678'
+        }, follow_redirects=True)
+        self.app.post('/login', data={
+            'email': 'TEST_pageuser@example.com',
+            'password': '12345678'
+        }, follow_redirects=True)
+        conn = get_db_connection()
+        user_id = conn.execute("SELECT id FROM users WHERE email = 'TEST_pageuser@example.com'").fetchone()['id']
+        media = [(0, 'TEST Song', 'TEST Artist'), (1, 'TEST Episode', 'TEST Publisher')]
+        records = [(user_id, 5, int(datetime(2025, 1, day, 10).timestamp()), media) for day in range(1, 6)]
+        records.append((None, 0, int(datetime(2025, 1, 3, 10).timestamp()), media))
+        insert_logs(conn, records)
+        conn.commit()
+        conn.close()
+
+        seen, cursor = [], None
+        while True:
+            response = self.app.get('/api/logs', query_string={'limit': 2, **({'cursor': cursor} if cursor else {})})
+            self.assertEqual(response.status_code, 200)
+            page = response.get_json()
+            self.assertLessEqual(len(page['logs']), 2)
+            seen.extend(page['logs'])
+            cursor = page['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual([log['datetime'][:10] for log in seen],
+                         ['2025-01-05', '2025-01-04', '2025-01-03', '2025-01-02', '2025-01-01'])
+        self.assertTrue(all(log['email'] == 'TEST_pageuser@example.com' for log in seen))
+        self.assertEqual(seen[0]['playlist'], 'Music: TEST Song by TEST Artist; Podcasts: TEST Episode by TEST Publisher')
+
+        response = self.app.get('/api/logs', query_string={'start': '2025-01-02', 'end': '2025-01-03'})
+        self.assertEqual(len(response.get_json()['logs']), 2)
+        response = self.app.get('/api/logs', query_string={'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_admin_analytics_requires_admin(self):
+        # TC-B23: The analytics endpoints are for admins only.
+        response = self.app.get('/admin/analytics/day')
+        self.assertEqual(response.status_code, 403)
+        response = self.app.get('/admin/analytics', follow_redirects=True)
+        self.assertIn(b'Admins only', response.data)
+
+    def test_admin_analytics_daily_rollup(self):
+        # TC-B24: Daily analytics for one user reflect the logs written for them.
+        self.app.post('/signup', data={
+            'name': 'TEST_StatsUser',
+            'email': 'TEST_statsuser@example.com',
+            'password': '12345678'
+        }, follow_redirects=True)
+        conn = get_db_connection()
+        user_id = conn.execute("SELECT id FROM users WHERE email = 'TEST_statsuser@example.com'").fetchone()['id']
+        insert_logs(conn, [(user_id, 3, int(datetime(2025, 2, 1, 12).timestamp()), []),
+                           (user_id, 3, int(datetime(2025, 2, 1, 13).timestamp()), []),
+                           (user_id, 4, int(datetime(2025, 2, 2, 12).timestamp()), [])])
+        conn.commit()
+        conn.close()
+        with self.app.session_transaction() as sess:
+            sess['admin'] = True
+        response = self.app.get('/admin/analytics/day', query_string={'email': 'TEST_statsuser@example.com'})
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data['totals'], {'neutral': 2, 'disgust': 1})
+        self.assertEqual(len(data['buckets']), 2)
+        response = self.app.get('/admin/analytics/week')
+        self.assertEqual(response.status_code, 404)
+        response = self.app.get('/admin/analytics/day', query_string={'email': 'TEST_nobody@example.com'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_upload_images_batch(self):
+        # TC-B25: Several files and a zip in one request give one result per image, in order.
+        response = self.app.post('/upload_images', data={}, follow_redirects=True)
+        self.assertEqual(response.status_code, 401)
+        self.app.post('/signup', data={
+            'name': 'TEST_BatchUser',
+            'email': 'TEST_batchuser@example.com',
+            'password': '12345678'
+        }, follow_redirects=True)
+        self.app.post('/login', data={
+            'email': 'TEST_batchuser@example.com',
+            'password': '12345678'
+        }, follow_redirects=True)
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zf:
+            zf.writestr('photos/one.jpg', self.test_image.getvalue())
+            zf.writestr('notes.txt', 'not an image')
+        archive.seek(0)
+        data = {'files': [(io.BytesIO(self.test_image.getvalue()), 'a.jpg'),
+                          (io.BytesIO(b'not an image'), 'b.jpg'),
+                          (archive, 'more.zip')]}
+        response = self.app.post('/upload_images', data=data, content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 200)
+        results = response.get_json()
+        self.assertEqual([r['name'] for r in results], ['a.jpg', 'b.jpg', 'photos/one.jpg'])
+        self.assertEqual(results[0]['faces'], [])
+        self.assertIn('error', results[1])
+
+        data = {'files': [(io.BytesIO(self.test_image.getvalue()), f'{i}.jpg') for i in range(3)]}
+        response = self.app.post('/upload_images?stream=1', data=data, content_type='multipart/form-data')
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual(sorted(line['index'] for line in lines), [0, 1, 2])
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,92 @@
+import os
+import queue
+import sqlite3
+import threading
+
+# How long a writer waits for a lock before "database is locked" is raised (milliseconds)
+BUSY_TIMEOUT_MS = int(os.getenv('DB_BUSY_TIMEOUT_MS', '5000'))
+# Idle connections kept open per database file
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '8'))
+# Compiled statements cached per connection; identical SQL strings skip re-preparation
+CACHED_STATEMENTS = 256
+
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection that goes back to the pool when closed instead of being torn down.
+
+    Callers keep the usual pattern (conn = get_connection(...); ...; conn.close()),
+    and leaving a `with conn:` block commits and returns the connection as well.
+    """
+    _pool = None
+    _pooled = False
+
+    def close(self):
+        if self._pooled:
+            return
+        if self.in_transaction:
+            self.rollback()
+        if self._pool is None:
+            super().close()
+            return
+        self._pooled = True
+        try:
+            self._pool.put_nowait(self)
+        except queue.Full:
+            self._pooled = False
+            super().close()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        result = super().__exit__(exc_type, exc_value, traceback)
+        self.close()
+        return result
+
+    def close_connection(self):
+        """Really close the underlying SQLite handle"""
+        self._pool = None
+        super().close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool(db_path):
+    with _pools_lock:
+        pool = _pools.get(db_path)
+        if pool is None:
+            pool = _pools[db_path] = queue.LifoQueue(maxsize=POOL_SIZE)
+        return pool
+
+
+def _open(db_path, pool):
+    conn = sqlite3.connect(db_path, factory=PooledConnection, timeout=BUSY_TIMEOUT_MS / 1000,
+                           cached_statements=CACHED_STATEMENTS, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn._pool = pool
+    return conn
+
+
+def get_connection(db_path, row_factory=sqlite3.Row):
+    """Check a WAL-mode connection out of the pool for db_path (opening one if the pool is empty)"""
+    pool = _get_pool(db_path)
+    try:
+        conn = pool.get_nowait()
+    except queue.Empty:
+        conn = _open(db_path, pool)
+    conn._pooled = False
+    conn.row_factory = row_factory
+    return conn
+
+
+def close_all(db_path=None):
+    """Close the idle pooled connections of one database, or of all of them"""
+    with _pools_lock:
+        pools = [_pools[db_path]] if db_path in _pools else ([] if db_path else list(_pools.values()))
+    for pool in pools:
+        while True:
+            try:
+                pool.get_nowait().close_connection()
+            except queue.Empty:
+                break
@@ -0,0 +1,230 @@
+import base64
+import hashlib
+import struct
+from datetime import datetime, timezone
+
+from analytics import create_rollup_schema, update_rollups
+from face_pipeline import emotion_mapping
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+EMOTION_IDS = {label: idx for idx, label in emotion_mapping.items()}
+
+# media.kind
+MUSIC = 0
+PODCAST = 1
+
+# Normalized log schema: one small row per detection pointing at a deduplicated,
+# ordered set of recommended media. Identical recommendation lists (the common
+# case, since they only depend on the emotion) are stored once.
+LOG_SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS media (
+        id INTEGER PRIMARY KEY,
+        kind INTEGER NOT NULL,
+        name TEXT NOT NULL,
+        creator TEXT NOT NULL,
+        UNIQUE (kind, name, creator)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS media_sets (
+        id INTEGER PRIMARY KEY,
+        digest BLOB NOT NULL UNIQUE
+    )''',
+    '''CREATE TABLE IF NOT EXISTS media_set_items (
+        set_id INTEGER NOT NULL REFERENCES media_sets (id),
+        position INTEGER NOT NULL,
+        media_id INTEGER NOT NULL REFERENCES media (id),
+        PRIMARY KEY (set_id, position)
+    ) WITHOUT ROWID''',
+    '''CREATE TABLE IF NOT EXISTS emotion_logs (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER REFERENCES users (id),
+        emotion INTEGER,
+        ts INTEGER NOT NULL,
+        media_set_id INTEGER REFERENCES media_sets (id)
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_emotion_logs_user_ts ON emotion_logs (user_id, ts)',
+    'CREATE INDEX IF NOT EXISTS idx_emotion_logs_emotion_ts ON emotion_logs (emotion, ts)',
+    # Unfiltered (admin) browsing walks this one
+    'CREATE INDEX IF NOT EXISTS idx_emotion_logs_ts ON emotion_logs (ts)',
+)
+
+
+def create_log_schema(conn):
+    for statement in LOG_SCHEMA:
+        conn.execute(statement)
+    create_rollup_schema(conn)
+
+
+def media_from_recommendations(recommendations):
+    """(kind, name, creator) tuples for the music and podcasts of a recommend_media result"""
+    if not recommendations:
+        return []
+    media = [(MUSIC, track.get('name', 'Unknown Title'), track.get('artist', 'Unknown Artist'))
+             for track in recommendations.get('music', [])]
+    media += [(PODCAST, podcast.get('name', 'Unknown Podcast'), podcast.get('publisher', 'Unknown Publisher'))
+              for podcast in recommendations.get('podcasts', [])]
+    return media
+
+
+def format_playlist(media):
+    """Human readable playlist text, in the format the logs page has always shown"""
+    music = [f"{name} by {creator}" for kind, name, creator in media if kind == MUSIC]
+    podcasts = [f"{name} by {creator}" for kind, name, creator in media if kind == PODCAST]
+    music_str = ", ".join(music) if music else "No music"
+    podcast_str = ", ".join(podcasts) if podcasts else "No podcasts"
+    return f"Music: {music_str}; Podcasts: {podcast_str}"
+
+
+class MediaCache:
+    """Ids of media rows and media sets already known to exist, so repeated inserts skip the lookups"""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.media = {}
+        self.sets = {}
+
+    def clear(self):
+        self.media.clear()
+        self.sets.clear()
+
+    def trim(self):
+        if len(self.media) + len(self.sets) > self.max_entries:
+            self.clear()
+
+
+def _media_id(conn, item, cache):
+    media_id = cache.media.get(item)
+    if media_id is None:
+        conn.execute('INSERT OR IGNORE INTO media (kind, name, creator) VALUES (?, ?, ?)', item)
+        media_id = conn.execute('SELECT id FROM media WHERE kind = ? AND name = ? AND creator = ?', item).fetchone()[0]
+        cache.media[item] = media_id
+    return media_id
+
+
+def media_set_id(conn, media, cache):
+    """Id of the deduplicated media set holding exactly these items in this order (None when empty)"""
+    if not media:
+        return None
+    media_ids = [_media_id(conn, tuple(item), cache) for item in media]
+    digest = hashlib.blake2b(struct.pack(f'<{len(media_ids)}q', *media_ids), digest_size=16).digest()
+    set_id = cache.sets.get(digest)
+    if set_id is None:
+        row = conn.execute('SELECT id FROM media_sets WHERE digest = ?', (digest,)).fetchone()
+        if row is None:
+            set_id = conn.execute('INSERT INTO media_sets (digest) VALUES (?)', (digest,)).lastrowid
+            conn.executemany('INSERT INTO media_set_items (set_id, position, media_id) VALUES (?, ?, ?)',
+                             [(set_id, position, media_id) for position, media_id in enumerate(media_ids)])
+        else:
+            set_id = row[0]
+        cache.sets[digest] = set_id
+    cache.trim()
+    return set_id
+
+
+def insert_logs(conn, records, cache=None):
+    """Insert (user_id, emotion_id, epoch_ts, media) records and count them in the rollups; the caller commits"""
+    cache = cache if cache is not None else MediaCache()
+    rows = [(user_id, emotion, ts, media_set_id(conn, media, cache)) for user_id, emotion, ts, media in records]
+    conn.executemany('INSERT INTO emotion_logs (user_id, emotion, ts, media_set_id) VALUES (?, ?, ?, ?)', rows)
+    update_rollups(conn, rows)
+    return rows
+
+
+def encode_cursor(row):
+    """Opaque keyset cursor pointing just after row (ordering is ts DESC, id DESC)"""
+    return base64.urlsafe_b64encode(f"{row['ts']}|{row['id']}".encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    try:
+        ts, row_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|", 1)
+        return int(ts), int(row_id)
+    except (ValueError, UnicodeError):
+        raise ValueError("Invalid cursor")
+
+
+def parse_date_bound(value, end=False, utc=False):
+    """Epoch seconds for YYYY-MM-DD or YYYY-MM-DD HH:MM:SS; a bare end date covers the whole day.
+
+    Dates are local time like the /logs datetimes, or UTC with utc=True like
+    the analytics rollup buckets.
+    """
+    if not value:
+        return None
+    for fmt in (DATETIME_FORMAT, "%Y-%m-%d"):
+        try:
+            parsed = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        if fmt == "%Y-%m-%d" and end:
+            parsed = parsed.replace(hour=23, minute=59, second=59)
+        if utc:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return int(parsed.timestamp())
+    raise ValueError(f"Invalid date: {value}")
+
+
+def _playlists(conn, set_ids):
+    set_ids = [set_id for set_id in set_ids if set_id is not None]
+    media = {set_id: [] for set_id in set_ids}
+    if not set_ids:
+        return media
+    placeholders = ",".join("?" * len(set_ids))
+    for set_id, kind, name, creator in conn.execute(
+            f'SELECT i.set_id, m.kind, m.name, m.creator FROM media_set_items i JOIN media m ON m.id = i.media_id '
+            f'WHERE i.set_id IN ({placeholders}) ORDER BY i.set_id, i.position', set_ids):
+        media[set_id].append((kind, name, creator))
+    return media
+
+
+def query_logs(conn, user_id=None, email=None, emotion=None, start=None, end=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """One page of logs, newest first, using keyset pagination.
+
+    Returns (logs, next_cursor); logs are dicts shaped like the old logs rows
+    (email, emotion label, formatted datetime, playlist text) and next_cursor
+    is None on the last page.
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    clauses, params = [], []
+    if user_id is not None:
+        clauses.append('l.user_id = ?')
+        params.append(user_id)
+    if email:
+        clauses.append('l.user_id = (SELECT id FROM users WHERE email = ?)')
+        params.append(email)
+    if emotion:
+        if emotion not in EMOTION_IDS:
+            raise ValueError(f"Unknown emotion: {emotion}")
+        clauses.append('l.emotion = ?')
+        params.append(EMOTION_IDS[emotion])
+    start = parse_date_bound(start)
+    if start is not None:
+        clauses.append('l.ts >= ?')
+        params.append(start)
+    end = parse_date_bound(end, end=True)
+    if end is not None:
+        clauses.append('l.ts <= ?')
+        params.append(end)
+    if cursor:
+        clauses.append('(l.ts, l.id) < (?, ?)')
+        params.extend(decode_cursor(cursor))
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    rows = conn.execute(
+        f'SELECT l.id, u.email, l.emotion, l.ts, l.media_set_id FROM emotion_logs l '
+        f'LEFT JOIN users u ON u.id = l.user_id {where} '
+        f'ORDER BY l.ts DESC, l.id DESC LIMIT ?',
+        params + [limit + 1]
+    ).fetchall()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    rows = rows[:limit]
+    playlists = _playlists(conn, {row['media_set_id'] for row in rows})
+    logs = [{
+        "id": row['id'],
+        "email": row['email'] or 'unknown',
+        "emotion": emotion_mapping.get(row['emotion'], 'Unknown Emotion'),
+        "datetime": datetime.fromtimestamp(row['ts']).strftime(DATETIME_FORMAT),
+        "playlist": format_playlist(playlists.get(row['media_set_id'], [])),
+    } for row in rows]
+    return logs, next_cursor
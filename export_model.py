@@ -0,0 +1,78 @@
+"""Export model.h5 to ONNX and TFLite for the lighter inference backends.
+
+Usage:
+    python export_model.py --model model.h5
+    python export_model.py --model model.h5 --formats onnx --out-dir exported/
+
+Writes model.onnx, model_int8.onnx (dynamic-range quantized), model_fp16.tflite
+and model_int8.tflite (dynamic-range quantized). Pick one at runtime with
+EMOTION_BACKEND=onnx|tflite and, if needed, EMOTION_MODEL_PATH.
+Compare them against the Keras baseline with benchmark_backends.py.
+"""
+import argparse
+import os
+
+from face_pipeline import IMG_SIZE
+from inference_backends import EXPORTED_MODEL_FILES
+
+
+def export_onnx(model, out_dir, opset=13):
+    """Convert the Keras model to ONNX and a dynamic-range int8 quantized copy"""
+    import tensorflow as tf
+    import tf2onnx
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    onnx_path = os.path.join(out_dir, EXPORTED_MODEL_FILES[("onnx", "float32")])
+    spec = (tf.TensorSpec((None, IMG_SIZE, IMG_SIZE, 3), tf.float32, name="input"),)
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=opset, output_path=onnx_path)
+    print(f"✅ Wrote {onnx_path}")
+
+    int8_path = os.path.join(out_dir, EXPORTED_MODEL_FILES[("onnx", "int8")])
+    quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QInt8)
+    print(f"✅ Wrote {int8_path}")
+    return [onnx_path, int8_path]
+
+
+def export_tflite(model, out_dir):
+    """Convert the Keras model to float16 and dynamic-range int8 TFLite models"""
+    import tensorflow as tf
+
+    written = []
+    for variant in ("float16", "int8"):
+        converter = tf.lite.TFLiteConverter.from_keras_model(model)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if variant == "float16":
+            converter.target_spec.supported_types = [tf.float16]
+        tflite_model = converter.convert()
+        path = os.path.join(out_dir, EXPORTED_MODEL_FILES[("tflite", variant)])
+        with open(path, "wb") as f:
+            f.write(tflite_model)
+        print(f"✅ Wrote {path} ({len(tflite_model) / 1e6:.1f} MB)")
+        written.append(path)
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the emotion model to ONNX / TFLite")
+    parser.add_argument("--model", default=os.getenv("EMOTION_KERAS_MODEL", "model.h5"), help="Path to model.h5")
+    parser.add_argument("--out-dir", default=None, help="Output directory (defaults to the model's directory)")
+    parser.add_argument("--formats", nargs="+", choices=["onnx", "tflite"], default=["onnx", "tflite"])
+    parser.add_argument("--opset", type=int, default=13, help="ONNX opset version")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.model):
+        parser.error(f"Model file not found at {args.model}")
+    out_dir = args.out_dir or os.path.dirname(os.path.abspath(args.model))
+    os.makedirs(out_dir, exist_ok=True)
+
+    from tensorflow.keras.models import load_model
+    model = load_model(args.model, compile=False)
+
+    if "onnx" in args.formats:
+        export_onnx(model, out_dir, opset=args.opset)
+    if "tflite" in args.formats:
+        export_tflite(model, out_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from face_pipeline import load_face_cascade
+
+
+def _empty_boxes():
+    return np.empty((0, 4), dtype=np.int32)
+
+
+class HaarDetector:
+    """Haar cascade detector with an optional downscaled pass.
+
+    Images whose longer side exceeds max_side are shrunk (INTER_AREA) before
+    detectMultiScale and the boxes are mapped back to full resolution, which
+    makes detection cost roughly independent of the upload size. max_side=None
+    (or 0) detects at full resolution, exactly like face_pipeline.detect_faces.
+
+    detectMultiScale is not reentrant, so each thread gets its own cascade. A
+    cascade passed in explicitly may be shared and is used under a lock.
+    """
+    name = "haar"
+
+    def __init__(self, max_side=800, scale_factor=1.1, min_neighbors=5, min_size=30, cascade=None):
+        self.max_side = max_side
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+        self._cascade = cascade
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @property
+    def cascade(self):
+        """The cascade for the calling thread"""
+        if self._cascade is not None:
+            return self._cascade
+        cascade = getattr(self._local, "cascade", None)
+        if cascade is None:
+            cascade = self._local.cascade = load_face_cascade()
+        return cascade
+
+    def detect(self, gray):
+        """Return (x, y, w, h) boxes in full-resolution coordinates"""
+        height, width = gray.shape[:2]
+        scale = 1.0
+        if self.max_side and max(height, width) > self.max_side:
+            scale = self.max_side / max(height, width)
+            gray = cv2.resize(gray, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+        # The cascade window is 24 px, so a smaller minimum size would not find anything anyway
+        min_size = max(24, round(self.min_size * scale))
+        if self._cascade is None:
+            faces = self.cascade.detectMultiScale(gray, scaleFactor=self.scale_factor, minNeighbors=self.min_neighbors,
+                                                  minSize=(min_size, min_size))
+        else:
+            with self._lock:
+                faces = self._cascade.detectMultiScale(gray, scaleFactor=self.scale_factor,
+                                                       minNeighbors=self.min_neighbors, minSize=(min_size, min_size))
+        if len(faces) == 0:
+            return _empty_boxes()
+        if scale != 1.0:
+            faces = np.round(np.asarray(faces) / scale).astype(np.int32)
+            faces[:, 2] = np.minimum(faces[:, 2], width - faces[:, 0])
+            faces[:, 3] = np.minimum(faces[:, 3], height - faces[:, 1])
+        return np.asarray(faces, dtype=np.int32)
+
+
+class DnnDetector:
+    """OpenCV DNN SSD face detector loaded from local files.
+
+    Works with the res10_300x300_ssd_iter_140000 Caffe model (model_path plus
+    the deploy.prototxt as config_path) or a TensorFlow / ONNX export of the
+    same network. The network always sees an input_size square, so its cost
+    does not depend on the image size.
+    """
+    name = "dnn"
+
+    def __init__(self, model_path, config_path=None, confidence=0.5, input_size=300):
+        if not model_path or not os.path.exists(model_path):
+            raise FileNotFoundError(f"Face detector model not found at {model_path}")
+        self.net = cv2.dnn.readNet(model_path, config_path or "")
+        self.confidence = confidence
+        self.input_size = input_size
+        # A cv2.dnn.Net keeps per-call state and is not safe to run from several threads at once
+        self._lock = threading.Lock()
+
+    def detect(self, gray):
+        height, width = gray.shape[:2]
+        image = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR) if gray.ndim == 2 else gray
+        blob = cv2.dnn.blobFromImage(image, 1.0, (self.input_size, self.input_size), (104.0, 177.0, 123.0))
+        with self._lock:
+            self.net.setInput(blob)
+            detections = self.net.forward().reshape(-1, 7)
+        detections = detections[detections[:, 2] >= self.confidence]
+        if len(detections) == 0:
+            return _empty_boxes()
+        corners = np.clip(detections[:, 3:7], 0.0, 1.0) * np.array([width, height, width, height])
+        boxes = np.column_stack([corners[:, :2], corners[:, 2:] - corners[:, :2]]).round().astype(np.int32)
+        return boxes[(boxes[:, 2] > 0) & (boxes[:, 3] > 0)]
+
+
+DETECTORS = {
+    "haar": HaarDetector,
+    "dnn": DnnDetector,
+}
+
+
+def load_detector(name, **kwargs):
+    """Instantiate a face detector by name"""
+    if name not in DETECTORS:
+        raise ValueError(f"Unknown face detector: {name} (choose from {', '.join(DETECTORS)})")
+    return DETECTORS[name](**kwargs)
+
+
+def detector_kwargs(config):
+    """Constructor arguments for the detector selected in a model_registry config"""
+    if config["face_detector"] == "dnn":
+        return {
+            "model_path": config["face_detector_model"],
+            "config_path": config["face_detector_config"],
+            "confidence": config["detect_confidence"],
+        }
+    return {
+        "max_side": config["detect_max_side"],
+        "scale_factor": config["detect_scale_factor"],
+        "min_neighbors": config["detect_min_neighbors"],
+    }
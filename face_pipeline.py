@@ -0,0 +1,67 @@
+import threading
+
+import cv2
+import numpy as np
+
+# Input resolution expected by the emotion model
+IMG_SIZE = 224
+
+# File extensions treated as images when walking directories or archives
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+emotion_mapping = {0: 'sad', 1: 'fear', 2: 'surprise', 3: 'neutral', 4: 'disgust', 5: 'happy', 6: 'angry'}
+
+
+def load_face_cascade():
+    """Build the Haar cascade used for face detection"""
+    return cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+
+
+def detect_faces(gray, face_cascade):
+    """Return (x, y, w, h) boxes of the faces found in a grayscale image"""
+    return face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
+
+
+class FaceBatchBuffer:
+    """Reusable float32 model batch plus a uint8 resize scratch, grown to the largest face count seen"""
+
+    def __init__(self, capacity=8):
+        self.batch = np.empty((capacity, IMG_SIZE, IMG_SIZE, 3), dtype=np.float32)
+        self.resized = np.empty((IMG_SIZE, IMG_SIZE), dtype=np.uint8)
+
+    def take(self, count):
+        if count > len(self.batch):
+            self.batch = np.empty((max(count, 2 * len(self.batch)), IMG_SIZE, IMG_SIZE, 3), dtype=np.float32)
+        return self.batch[:count]
+
+
+_local = threading.local()
+
+
+def thread_face_buffer():
+    """The calling thread's FaceBatchBuffer; a batch built in it stays valid until the thread's next preprocess"""
+    buffer = getattr(_local, "face_buffer", None)
+    if buffer is None:
+        buffer = _local.face_buffer = FaceBatchBuffer()
+    return buffer
+
+
+def preprocess_faces(gray, faces, buffer=None):
+    """Crop, resize and normalise every face into an (N, IMG_SIZE, IMG_SIZE, 3) float32 model batch.
+
+    Each crop is resized into a uint8 scratch and scaled straight into its
+    batch slot, broadcasting the single gray channel to all three, so there
+    are no per-face copies or float64 temporaries. With a FaceBatchBuffer the
+    returned batch is a view of its reused memory; without one a new array is
+    allocated.
+    """
+    if buffer is None:
+        batch = np.empty((len(faces), IMG_SIZE, IMG_SIZE, 3), dtype=np.float32)
+        resized = np.empty((IMG_SIZE, IMG_SIZE), dtype=np.uint8)
+    else:
+        batch = buffer.take(len(faces))
+        resized = buffer.resized
+    for i, (x, y, w, h) in enumerate(faces):
+        cv2.resize(gray[y:y+h, x:x+w], (IMG_SIZE, IMG_SIZE), dst=resized)
+        np.divide(resized[:, :, np.newaxis], np.float32(255.0), out=batch[i])
+    return batch
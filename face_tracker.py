@@ -0,0 +1,188 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+import cv2
+import numpy as np
+
+# Full detection every N frames; boxes are propagated by template matching in between
+TRACK_DETECT_EVERY = int(os.getenv('TRACK_DETECT_EVERY', '5'))
+# Mean absolute pixel change (0-255) of a face thumbnail since its last classification that triggers a new one
+TRACK_CHANGE_THRESHOLD = float(os.getenv('TRACK_CHANGE_THRESHOLD', '8'))
+# Classifications averaged per face to pick the label
+TRACK_SMOOTHING_WINDOW = int(os.getenv('TRACK_SMOOTHING_WINDOW', '5'))
+
+# Faces are matched at this width, so tracking costs the same for small and large faces
+TEMPLATE_WIDTH = 32
+THUMB_SIZE = (16, 16)
+
+
+def iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+    return inter / union if union else 0.0
+
+
+class Track:
+    """One face followed across frames"""
+    __slots__ = ("box", "template", "scale", "thumb", "history")
+
+    def __init__(self, box, window):
+        self.box = box
+        self.template = None
+        self.scale = 1.0
+        self.thumb = None
+        self.history = deque(maxlen=window)
+
+    def set_template(self, gray):
+        x, y, w, h = self.box
+        self.scale = TEMPLATE_WIDTH / w
+        self.template = cv2.resize(gray[y:y+h, x:x+w], (TEMPLATE_WIDTH, max(1, round(h * self.scale))))
+
+    def probabilities(self):
+        return np.mean(self.history, axis=0)
+
+
+class FaceTracker:
+    """Per-stream face tracker that avoids redundant detection and classification.
+
+    detect_fn(gray) returns (x, y, w, h) boxes; classify_fn(gray, boxes) returns
+    an (N, classes) probability array. update() runs detection every
+    detect_every frames (or as soon as a face is lost), follows faces by
+    template matching in between, re-classifies a face only when its crop has
+    changed by more than change_threshold since its last classification, and
+    reports each face's label averaged over its last window classifications.
+    """
+
+    def __init__(self, detect_fn, classify_fn, detect_every=TRACK_DETECT_EVERY,
+                 change_threshold=TRACK_CHANGE_THRESHOLD, window=TRACK_SMOOTHING_WINDOW,
+                 match_threshold=0.6, iou_threshold=0.3):
+        self.detect_fn = detect_fn
+        self.classify_fn = classify_fn
+        self.detect_every = detect_every
+        self.change_threshold = change_threshold
+        self.window = window
+        self.match_threshold = match_threshold
+        self.iou_threshold = iou_threshold
+        self.tracks = []
+        self._frame = 0
+        self._lock = threading.Lock()
+        self.detections = 0
+        self.classified = 0
+
+    def update(self, gray):
+        """Process one grayscale frame; returns (boxes, emotion ids, smoothed probabilities) like classify_image"""
+        with self._lock:
+            detect = not self.tracks or self._frame % self.detect_every == 0
+            if not detect:
+                detect = not all(self._follow(gray, track) for track in self.tracks)
+            if detect:
+                self._detect(gray)
+            self._frame += 1
+            self._classify_changed(gray)
+            if not self.tracks:
+                return [], [], []
+            probabilities = np.array([track.probabilities() for track in self.tracks])
+            boxes = np.array([track.box for track in self.tracks])
+            return boxes, [int(idx) for idx in np.argmax(probabilities, axis=1)], probabilities
+
+    def stats(self):
+        return {"frames": self._frame, "detections": self.detections, "classified": self.classified}
+
+    def _detect(self, gray):
+        self.detections += 1
+        boxes = [tuple(int(v) for v in box) for box in self.detect_fn(gray)]
+        # Greedy IoU matching keeps each face's label history across detections
+        pairs = sorted(((iou(track.box, box), t, b) for t, track in enumerate(self.tracks)
+                        for b, box in enumerate(boxes)), reverse=True)
+        matched_tracks, matched_boxes, tracks = set(), set(), []
+        for overlap, t, b in pairs:
+            if overlap < self.iou_threshold:
+                break
+            if t in matched_tracks or b in matched_boxes:
+                continue
+            matched_tracks.add(t)
+            matched_boxes.add(b)
+            track = self.tracks[t]
+            track.box = boxes[b]
+            tracks.append(track)
+        tracks += [Track(box, self.window) for b, box in enumerate(boxes) if b not in matched_boxes]
+        for track in tracks:
+            track.set_template(gray)
+        self.tracks = tracks
+
+    def _follow(self, gray, track):
+        """Move the track to the best template match around its last box; False when it is lost"""
+        x, y, w, h = track.box
+        height, width = gray.shape[:2]
+        x0, y0 = max(0, x - w // 2), max(0, y - h // 2)
+        x1, y1 = min(width, x + w + w // 2), min(height, y + h + h // 2)
+        roi = cv2.resize(gray[y0:y1, x0:x1], (max(1, round((x1 - x0) * track.scale)), max(1, round((y1 - y0) * track.scale))))
+        th, tw = track.template.shape
+        if roi.shape[0] < th or roi.shape[1] < tw:
+            return False
+        _, score, _, (mx, my) = cv2.minMaxLoc(cv2.matchTemplate(roi, track.template, cv2.TM_CCOEFF_NORMED))
+        if score < self.match_threshold:
+            return False
+        nx = min(max(0, x0 + round(mx / track.scale)), width - w)
+        ny = min(max(0, y0 + round(my / track.scale)), height - h)
+        track.box = (nx, ny, w, h)
+        return True
+
+    def _classify_changed(self, gray):
+        pending, thumbs = [], []
+        for track in self.tracks:
+            x, y, w, h = track.box
+            thumb = cv2.resize(gray[y:y+h, x:x+w], THUMB_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32)
+            if track.thumb is None or np.mean(np.abs(thumb - track.thumb)) > self.change_threshold:
+                pending.append(track)
+                thumbs.append(thumb)
+        if not pending:
+            return
+        probabilities = self.classify_fn(gray, np.array([track.box for track in pending]))
+        self.classified += len(pending)
+        for track, thumb, probs in zip(pending, thumbs, probabilities):
+            track.thumb = thumb
+            track.history.append(np.asarray(probs, dtype=np.float32))
+
+
+class TrackerPool:
+    """One FaceTracker per live stream, dropped after ttl seconds without frames"""
+
+    def __init__(self, factory, ttl=300, max_streams=1000):
+        self.factory = factory
+        self.ttl = ttl
+        self.max_streams = max_streams
+        self._trackers = OrderedDict()
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def get(self, stream_id):
+        now = time.monotonic()
+        with self._lock:
+            while self._trackers:
+                oldest = next(iter(self._trackers))
+                if now - self._seen[oldest] < self.ttl and len(self._trackers) <= self.max_streams:
+                    break
+                del self._trackers[oldest]
+                del self._seen[oldest]
+            tracker = self._trackers.get(stream_id)
+            if tracker is None:
+                tracker = self._trackers[stream_id] = self.factory()
+            else:
+                self._trackers.move_to_end(stream_id)
+            self._seen[stream_id] = now
+            return tracker
+
+    def discard(self, stream_id):
+        with self._lock:
+            self._trackers.pop(stream_id, None)
+            self._seen.pop(stream_id, None)
+
+    def __len__(self):
+        return len(self._trackers)
@@ -0,0 +1,91 @@
+import os
+import struct
+
+import cv2
+import numpy as np
+
+MB = 1024 * 1024
+# Largest single image accepted; uploads are read in chunks and abandoned past this
+MAX_IMAGE_BYTES = int(float(os.getenv('MAX_IMAGE_MB', '20')) * MB)
+# Refuse images whose header announces more pixels than this (decompression bombs)
+MAX_IMAGE_PIXELS = int(os.getenv('MAX_IMAGE_PIXELS', str(100_000_000)))
+# Large images are decoded at 1/2, 1/4 or 1/8 scale while their longer side stays at least this long
+MAX_DECODE_SIDE = int(os.getenv('MAX_DECODE_SIDE', '1600'))
+READ_CHUNK = 64 * 1024
+
+_REDUCED_COLOR = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+                  4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+_REDUCED_GRAYSCALE = {1: cv2.IMREAD_GRAYSCALE, 2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+                      4: cv2.IMREAD_REDUCED_GRAYSCALE_4, 8: cv2.IMREAD_REDUCED_GRAYSCALE_8}
+# JPEG start-of-frame markers (C4, C8 and CC are other segment types)
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+class ImageTooLarge(ValueError):
+    """Raised when an upload exceeds the byte or pixel limits"""
+
+
+def read_upload(file_storage, max_bytes=MAX_IMAGE_BYTES):
+    """Read an uploaded file in chunks, giving up as soon as it passes max_bytes"""
+    chunks, total = [], 0
+    while True:
+        chunk = file_storage.stream.read(READ_CHUNK)
+        if not chunk:
+            break
+        total += len(chunk)
+        if total > max_bytes:
+            raise ImageTooLarge(f"Image is larger than {max_bytes / MB:g} MB.")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def image_size(data):
+    """(width, height) from a PNG or JPEG header without decoding, None for anything else"""
+    if data[:8] == b'\x89PNG\r\n\x1a\n' and data[12:16] == b'IHDR':
+        return struct.unpack('>II', data[16:24])
+    if data[:2] != b'\xff\xd8':
+        return None
+    i = 2
+    while i + 4 <= len(data):
+        if data[i] != 0xFF:
+            i += 1
+            continue
+        marker = data[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            # Standalone markers have no length
+            i += 2
+            continue
+        if marker in _SOF_MARKERS and i + 9 <= len(data):
+            height, width = struct.unpack('>HH', data[i + 5:i + 9])
+            return width, height
+        i += 2 + struct.unpack('>H', data[i + 2:i + 4])[0]
+    return None
+
+
+def decode_factor(size, max_side=MAX_DECODE_SIDE):
+    """Largest of 8, 4, 2 (else 1) that keeps the longer side at or above max_side"""
+    if not size or not max_side:
+        return 1
+    longest = max(size)
+    for factor in (8, 4, 2):
+        if longest // factor >= max_side:
+            return factor
+    return 1
+
+
+def decode_image(data, max_side=MAX_DECODE_SIDE, grayscale=False):
+    """Decode upload bytes to a BGR (or grayscale) array, None if they are not an image.
+
+    The reduction factor is picked from the header dimensions, so libjpeg
+    scales while decoding (DCT scaling) and a 12 MP photo never exists in
+    memory at full size. cv2.imdecode applies the EXIF orientation, in the
+    reduced modes too.
+    """
+    size = image_size(data)
+    if size and size[0] * size[1] > MAX_IMAGE_PIXELS:
+        raise ImageTooLarge(f"Image is larger than {MAX_IMAGE_PIXELS / 1e6:g} megapixels.")
+    flags = (_REDUCED_GRAYSCALE if grayscale else _REDUCED_COLOR)[decode_factor(size, max_side)]
+    return cv2.imdecode(np.frombuffer(data, np.uint8), flags)
@@ -0,0 +1,103 @@
+import os
+import threading
+
+import numpy as np
+
+# Every backend exposes the same interface: predict(batch) -> (N, classes) probabilities
+# for an (N, 224, 224, 3) float32 batch. Heavy runtimes are imported only when the
+# corresponding backend is constructed, so an ONNX or TFLite deployment never imports TensorFlow.
+
+
+class KerasBackend:
+    """Reference backend: the original model.h5 loaded through Keras"""
+    name = "keras"
+
+    def __init__(self, model_path, num_threads=None):
+        from tensorflow.keras.models import load_model
+        self.model = load_model(model_path, compile=False)
+
+    def predict(self, batch):
+        return self.model.predict(batch, verbose=0)
+
+
+class OnnxBackend:
+    """ONNX Runtime backend for models produced by export_model.py"""
+    name = "onnx"
+
+    def __init__(self, model_path, num_threads=None):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, batch):
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class TFLiteBackend:
+    """TFLite backend (float16 or dynamic-range int8 models), using tflite_runtime when available"""
+    name = "tflite"
+
+    def __init__(self, model_path, num_threads=None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self.input_index = self.interpreter.get_input_details()[0]["index"]
+        self.output_index = self.interpreter.get_output_details()[0]["index"]
+        self._batch_size = None
+        # A TFLite interpreter is not safe to invoke from several threads at once
+        self._lock = threading.Lock()
+
+    def predict(self, batch):
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        with self._lock:
+            if batch.shape[0] != self._batch_size:
+                self.interpreter.resize_tensor_input(self.input_index, batch.shape)
+                self.interpreter.allocate_tensors()
+                self._batch_size = batch.shape[0]
+            self.interpreter.set_tensor(self.input_index, batch)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self.output_index).copy()
+
+
+BACKENDS = {
+    KerasBackend.name: KerasBackend,
+    OnnxBackend.name: OnnxBackend,
+    TFLiteBackend.name: TFLiteBackend,
+}
+
+# File names written by export_model.py next to the Keras model
+EXPORTED_MODEL_FILES = {
+    ("onnx", "float32"): "model.onnx",
+    ("onnx", "int8"): "model_int8.onnx",
+    ("tflite", "float16"): "model_fp16.tflite",
+    ("tflite", "int8"): "model_int8.tflite",
+}
+
+
+def default_model_path(backend, keras_model_path, variant=None):
+    """Where export_model.py puts the model for a backend, relative to the Keras model"""
+    if backend == KerasBackend.name:
+        return keras_model_path
+    if variant is None:
+        variant = "float32" if backend == OnnxBackend.name else "int8"
+    file_name = EXPORTED_MODEL_FILES.get((backend, variant))
+    if file_name is None:
+        raise ValueError(f"Unknown {backend} model variant: {variant}")
+    return os.path.join(os.path.dirname(keras_model_path), file_name)
+
+
+def load_backend(name, model_path, num_threads=None):
+    """Instantiate the inference backend called name for the given model file"""
+    try:
+        backend_cls = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown inference backend '{name}', expected one of {sorted(BACKENDS)}")
+    return backend_cls(model_path, num_threads=num_threads)
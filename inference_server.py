@@ -0,0 +1,116 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class BatchScheduler:
+    """Micro-batches face crops from concurrent requests into shared model calls.
+
+    Callers submit an (N, H, W, C) array of preprocessed faces and get back a
+    Future. A single worker thread drains the queue and flushes everything it
+    has collected to ``predict_fn`` as one batch as soon as either
+    ``max_batch_size`` faces are waiting or ``max_delay_ms`` has passed since the
+    first face of the batch arrived.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=32, max_delay_ms=5.0):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay_ms / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.batches = 0
+        self.faces = 0
+
+    def submit(self, faces):
+        """Queue a batch of faces, returns a Future resolving to their predictions"""
+        future = Future()
+        if len(faces) == 0:
+            future.set_result(np.empty((0,), dtype=np.float32))
+            return future
+        self._ensure_started()
+        self._queue.put((faces, future))
+        return future
+
+    def predict(self, faces, timeout=60.0):
+        """Blocking helper: submit faces and wait for their predictions.
+
+        The timeout is generous (the first call may load the model) but finite,
+        so a stuck model call surfaces as a TimeoutError instead of a hung request.
+        """
+        return self.submit(faces).result(timeout)
+
+    def shutdown(self, timeout=None):
+        """Flush whatever is queued and stop the worker thread"""
+        with self._lock:
+            thread = self._thread
+            if thread is None:
+                return
+            self._queue.put(None)
+            self._thread = None
+        thread.join(timeout)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "faces": self.faces,
+            "avg_batch_size": (self.faces / self.batches) if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+        }
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="inference-batcher", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            pending = [item]
+            size = len(item[0])
+            deadline = time.monotonic() + self.max_delay
+            stopping = False
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                pending.append(item)
+                size += len(item[0])
+            self._flush(pending)
+            if stopping:
+                return
+
+    def _flush(self, pending):
+        pending = [(faces, future) for faces, future in pending if future.set_running_or_notify_cancel()]
+        if not pending:
+            return
+        try:
+            # Inside the try: mismatched shapes or dtypes must fail these futures, not the worker thread
+            batch = pending[0][0] if len(pending) == 1 else np.concatenate([faces for faces, _ in pending])
+            predictions = np.asarray(self.predict_fn(batch))
+        except Exception as e:
+            for _, future in pending:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.faces += len(batch)
+        offset = 0
+        for faces, future in pending:
+            future.set_result(predictions[offset:offset + len(faces)])
+            offset += len(faces)
@@ -0,0 +1,107 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+from face_pipeline import emotion_mapping
+
+# Streams with no frame for this long are dropped (seconds)
+LIVE_SESSION_TTL = float(os.getenv('LIVE_SESSION_TTL', '900'))
+# Per-frame points kept per stream (about 5 minutes at 10 frames per second)
+LIVE_SESSION_MAX_POINTS = int(os.getenv('LIVE_SESSION_MAX_POINTS', '3000'))
+LIVE_SESSION_MAX_STREAMS = int(os.getenv('LIVE_SESSION_MAX_STREAMS', '10000'))
+
+
+class LiveSession:
+    """Counters and a bounded time series of per-frame predictions for one live stream"""
+    __slots__ = ("counts", "frames", "series", "started", "updated")
+
+    def __init__(self, max_points, now):
+        self.counts = [0] * len(emotion_mapping)
+        self.frames = 0
+        self.series = deque(maxlen=max_points)
+        self.started = now
+        self.updated = now
+
+    def add(self, ts, emotion_id, confidence):
+        self.frames += 1
+        if emotion_id is not None:
+            self.counts[emotion_id] += 1
+        self.series.append((ts, emotion_id, confidence))
+        self.updated = ts
+
+    def snapshot(self):
+        return {
+            "counts": {idx: count for idx, count in enumerate(self.counts)},
+            "frames": self.frames,
+            "series": list(self.series),
+            "started": self.started,
+            "updated": self.updated,
+        }
+
+
+class MemoryLiveSessionStore:
+    """In-process live session store keyed by stream id.
+
+    Streams are kept in least-recently-updated order, so expiring them only
+    looks at the front of the dict. Fine for a single process; run a shared
+    backend (see STORE_BACKENDS) when serving from several workers.
+    """
+
+    def __init__(self, ttl=LIVE_SESSION_TTL, max_points=LIVE_SESSION_MAX_POINTS, max_streams=LIVE_SESSION_MAX_STREAMS):
+        self.ttl = ttl
+        self.max_points = max_points
+        self.max_streams = max_streams
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, stream_id, emotion_id, confidence=None, ts=None):
+        """Add one frame's prediction (emotion_id None when no face was found)"""
+        now = time.time() if ts is None else ts
+        with self._lock:
+            self._evict(now)
+            live = self._sessions.get(stream_id)
+            if live is None:
+                live = self._sessions[stream_id] = LiveSession(self.max_points, now)
+                if len(self._sessions) > self.max_streams:
+                    self._sessions.popitem(last=False)
+            else:
+                self._sessions.move_to_end(stream_id)
+            live.add(now, emotion_id, confidence)
+
+    def get(self, stream_id):
+        """Snapshot dict of the stream (see LiveSession.snapshot), or None if unknown or expired"""
+        with self._lock:
+            self._evict(time.time())
+            live = self._sessions.get(stream_id)
+            return live.snapshot() if live is not None else None
+
+    def discard(self, stream_id):
+        with self._lock:
+            self._sessions.pop(stream_id, None)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _evict(self, now):
+        while self._sessions:
+            stream_id, live = next(iter(self._sessions.items()))
+            if now - live.updated < self.ttl:
+                break
+            del self._sessions[stream_id]
+
+
+STORE_BACKENDS = {
+    "memory": MemoryLiveSessionStore,
+}
+
+
+def create_store(name=None, **kwargs):
+    """Build the live session store selected by name (or LIVE_SESSION_BACKEND)"""
+    name = name or os.getenv('LIVE_SESSION_BACKEND', 'memory')
+    if name not in STORE_BACKENDS:
+        raise ValueError(f"Unknown live session backend: {name} (choose from {', '.join(STORE_BACKENDS)})")
+    return STORE_BACKENDS[name](**kwargs)
+
+
+store = create_store()
@@ -0,0 +1,101 @@
+import json
+import threading
+
+
+class LatestFrameSlot:
+    """Single-slot mailbox between the socket reader and the frame worker.
+
+    A frame that arrives while the previous one is still waiting replaces it,
+    so a worker that falls behind skips straight to the newest frame instead
+    of building up latency.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._frame = None
+        self._closed = False
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, frame):
+        with self._cond:
+            if self._frame is not None:
+                self.dropped += 1
+            self._frame = frame
+            self.received += 1
+            self._cond.notify()
+
+    def take(self):
+        """Block for the next frame; None once the slot is closed"""
+        with self._cond:
+            while self._frame is None and not self._closed:
+                self._cond.wait()
+            frame, self._frame = self._frame, None
+            return frame
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._frame = None
+            self._cond.notify_all()
+
+
+def serve_frames(ws, handle_frame, max_size=None):
+    """Read binary frames from ws and answer each processed one with handle_frame's result.
+
+    The calling thread only receives; a worker thread runs handle_frame on the
+    latest frame and sends back whatever it returns (nothing when it returns
+    None). Frames that arrive while the worker is busy are dropped, frames
+    over max_size bytes are answered with a JSON error and never decoded.
+    Returns the received / processed / dropped / rejected counts once the
+    client disconnects.
+    """
+    slot = LatestFrameSlot()
+    processed = rejected = 0
+
+    def work():
+        nonlocal processed
+        while True:
+            frame = slot.take()
+            if frame is None:
+                return
+            try:
+                reply = handle_frame(frame)
+            except Exception as e:
+                print(f"❌ Live frame failed: {e}")
+                reply = json.dumps({"error": str(e)})
+            processed += 1
+            if reply is None:
+                continue
+            try:
+                ws.send(reply)
+            except Exception:
+                # Client went away; the reader notices on its next receive
+                slot.close()
+                return
+
+    worker = threading.Thread(target=work, name="live-socket", daemon=True)
+    worker.start()
+    try:
+        while True:
+            try:
+                message = ws.receive()
+            except Exception:
+                # simple_websocket raises ConnectionClosed when the client disconnects
+                break
+            if message is None:
+                break
+            if not isinstance(message, (bytes, bytearray)):
+                continue
+            if max_size is not None and len(message) > max_size:
+                rejected += 1
+                try:
+                    ws.send(json.dumps({"error": f"Frame larger than {max_size} bytes."}))
+                except Exception:
+                    break
+                continue
+            slot.put(bytes(message))
+    finally:
+        slot.close()
+        worker.join()
+    return {"received": slot.received, "processed": processed, "dropped": slot.dropped, "rejected": rejected}
@@ -0,0 +1,113 @@
+import queue
+import threading
+import time
+
+from db import get_connection
+from emotion_logs import MediaCache, insert_logs
+
+
+class LogWriter:
+    """Write-behind queue for emotion log rows.
+
+    Requests hand records to submit() and return immediately; a background thread
+    groups them into one multi-row transaction per flush, triggered by batch_size
+    records or flush_interval seconds, whichever comes first. shutdown() drains
+    the queue before returning.
+    """
+
+    def __init__(self, db_path, max_queue=10000, batch_size=500, flush_interval=0.25, put_timeout=0.05):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._media_cache = MediaCache()
+        self.written = 0
+        self.transactions = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def submit(self, user_id, emotion_id, ts, media):
+        """Queue a log record (media as (kind, name, creator) tuples); returns False if it had to be dropped"""
+        self._ensure_started()
+        try:
+            self._queue.put((user_id, emotion_id, ts, media), timeout=self.put_timeout)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            print("❌ Log queue full, dropping log record")
+            return False
+
+    def flush(self):
+        """Block until every record submitted so far has been written"""
+        if self._thread is not None:
+            self._queue.join()
+
+    def shutdown(self, timeout=None):
+        """Write out everything still queued and stop the writer thread"""
+        with self._lock:
+            thread = self._thread
+            if thread is None:
+                return
+            self._thread = None
+        self._queue.put(None)
+        thread.join(timeout)
+
+    def stats(self):
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "transactions": self.transactions,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            if record is None:
+                self._queue.task_done()
+                return
+            batch = [record]
+            deadline = time.monotonic() + self.flush_interval
+            stopping = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    record = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if record is None:
+                    stopping = True
+                    break
+                batch.append(record)
+            self._write(batch)
+            for _ in batch:
+                self._queue.task_done()
+            if stopping:
+                self._queue.task_done()
+                return
+
+    def _write(self, batch):
+        try:
+            with get_connection(self.db_path) as conn:
+                insert_logs(conn, batch, self._media_cache)
+            self.written += len(batch)
+            self.transactions += 1
+        except Exception as e:
+            # Ids cached during a rolled back transaction may not exist
+            self._media_cache.clear()
+            self.failed += len(batch)
+            print(f"❌ Failed to write {len(batch)} log records: {e}")
@@ -0,0 +1,137 @@
+"""Migrate the legacy logs table of users.db to the normalized emotion_logs schema.
+
+Usage:
+    python migrate_logs.py                      # migrate users.db, keep the old table as logs_legacy
+    python migrate_logs.py --db users.db --drop-legacy --vacuum
+
+The legacy table stores the email, the emotion label, a formatted datetime and
+the whole playlist as text on every row. The new schema stores a user_id, the
+emotion as an integer, an epoch timestamp and a reference to a deduplicated set
+of media (see emotion_logs.py). Rows whose email no longer matches a user are
+kept with user_id NULL. Rows whose datetime cannot be parsed are not migrated:
+they are reported and stay in logs_legacy, which is then kept even with
+--drop-legacy. Missing analytics rollups are rebuilt afterwards.
+
+`python app.py` and `flask --app app init-db` run the same migration at
+startup; requests never do, they only warn while the legacy table is there.
+"""
+import argparse
+import os
+from datetime import datetime
+
+from analytics import rebuild_rollups, rollups_need_rebuild
+from db import get_connection
+from emotion_logs import DATETIME_FORMAT, EMOTION_IDS, MUSIC, PODCAST, MediaCache, create_log_schema, insert_logs
+
+
+def has_legacy_logs(conn):
+    """True when users.db still has the old text-based logs table"""
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(logs)')}
+    return 'email' in columns and 'playlist' in columns
+
+
+def _split_items(text, kind):
+    """Best-effort split of "A by X, B by Y" back into (kind, name, creator) tuples"""
+    text = text.strip()
+    if not text or text in ("No music", "No podcasts"):
+        return []
+    items = []
+    for piece in text.split(", "):
+        if " by " not in piece and items:
+            # A comma inside a name: glue it back onto the previous entry
+            prev_kind, prev_name, prev_creator = items.pop()
+            items.append((prev_kind, prev_name, f"{prev_creator}, {piece}"))
+            continue
+        name, _, creator = piece.rpartition(" by ")
+        items.append((kind, name or piece, creator or "Unknown"))
+    return items
+
+
+def parse_playlist(text):
+    """Turn a legacy "Music: ...; Podcasts: ..." string into media tuples"""
+    if not text:
+        return []
+    music, _, podcasts = text.partition("; Podcasts: ")
+    if music.startswith("Music: "):
+        music = music[len("Music: "):]
+    return _split_items(music, MUSIC) + _split_items(podcasts, PODCAST)
+
+
+def _epoch(value):
+    """Epoch seconds of a legacy datetime string, None when it cannot be parsed"""
+    try:
+        return int(datetime.strptime(value, DATETIME_FORMAT).timestamp())
+    except (TypeError, ValueError):
+        return None
+
+
+def migrate_legacy_logs(conn, batch_size=5000, drop_legacy=False):
+    """Copy every legacy log row into emotion_logs in one transaction, then retire the old table.
+
+    Returns (rows migrated, ids of the legacy rows skipped for an unparseable
+    datetime). With skipped rows the old table is renamed to logs_legacy even
+    when drop_legacy is set, so nothing is lost.
+    """
+    create_log_schema(conn)
+    user_ids = dict(conn.execute('SELECT email, id FROM users').fetchall())
+    cache = MediaCache()
+    migrated, skipped = 0, []
+    legacy = conn.execute('SELECT id, email, emotion, datetime, playlist FROM logs ORDER BY id')
+    while True:
+        rows = legacy.fetchmany(batch_size)
+        if not rows:
+            break
+        records = []
+        for row_id, email, emotion, when, playlist in rows:
+            ts = _epoch(when)
+            if ts is None:
+                skipped.append(row_id)
+                continue
+            records.append((user_ids.get(email), EMOTION_IDS.get(emotion), ts, parse_playlist(playlist)))
+        insert_logs(conn, records, cache)
+        migrated += len(records)
+    if drop_legacy and not skipped:
+        conn.execute('DROP TABLE logs')
+    else:
+        conn.execute('ALTER TABLE logs RENAME TO logs_legacy')
+    conn.commit()
+    return migrated, skipped
+
+
+def report_migration(migrated, skipped):
+    print(f"✅ Migrated {migrated} log rows.")
+    if skipped:
+        shown = ", ".join(str(row_id) for row_id in skipped[:10]) + (", ..." if len(skipped) > 10 else "")
+        print(f"❌ Skipped {len(skipped)} rows with an unparseable datetime (logs_legacy ids {shown}); "
+              f"they are kept in logs_legacy.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migrate legacy logs to the normalized schema")
+    parser.add_argument("--db", default="users.db", help="SQLite database to migrate")
+    parser.add_argument("--drop-legacy", action="store_true", help="Drop the old logs table instead of keeping logs_legacy")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM afterwards to return the freed space")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        parser.error(f"Database not found at {args.db}")
+    size_before = os.path.getsize(args.db)
+    conn = get_connection(args.db, row_factory=None)
+    if has_legacy_logs(conn):
+        report_migration(*migrate_legacy_logs(conn, drop_legacy=args.drop_legacy))
+    else:
+        print("✅ No legacy logs table found, nothing to migrate.")
+        create_log_schema(conn)
+    if rollups_need_rebuild(conn):
+        print("Backfilling the emotion analytics rollups from existing logs...")
+        rebuild_rollups(conn)
+        conn.commit()
+    if args.vacuum:
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        conn.execute('VACUUM')
+    conn.close()
+    print(f"   {args.db}: {size_before / 1e6:.1f} MB -> {os.path.getsize(args.db) / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
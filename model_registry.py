@@ -0,0 +1,139 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+from face_detector import detector_kwargs, load_detector
+from face_pipeline import IMG_SIZE
+from inference_backends import default_model_path, load_backend
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Settings can come from a JSON config file (EMOTION_CONFIG, default emotion_config.json)
+# and are overridden by the matching environment variables.
+DEFAULT_CONFIG = {
+    "backend": "keras",
+    "keras_model_path": os.path.join(BASE_DIR, "model.h5"),
+    "model_path": None,
+    "model_variant": None,
+    "num_threads": None,
+    "warmup": False,
+    # Face detection: "haar" (downscaled to detect_max_side, 0 = full resolution) or "dnn" (local model files)
+    "face_detector": "haar",
+    "face_detector_model": None,
+    "face_detector_config": None,
+    "detect_max_side": 800,
+    "detect_scale_factor": 1.1,
+    "detect_min_neighbors": 5,
+    "detect_confidence": 0.5,
+}
+
+ENV_OVERRIDES = {
+    "backend": "EMOTION_BACKEND",
+    "keras_model_path": "EMOTION_KERAS_MODEL",
+    "model_path": "EMOTION_MODEL_PATH",
+    "model_variant": "EMOTION_MODEL_VARIANT",
+    "num_threads": "EMOTION_NUM_THREADS",
+    "warmup": "EMOTION_WARMUP",
+    "face_detector": "FACE_DETECTOR",
+    "face_detector_model": "FACE_DETECTOR_MODEL",
+    "face_detector_config": "FACE_DETECTOR_CONFIG",
+    "detect_max_side": "FACE_DETECT_MAX_SIDE",
+    "detect_scale_factor": "FACE_DETECT_SCALE_FACTOR",
+    "detect_min_neighbors": "FACE_DETECT_MIN_NEIGHBORS",
+    "detect_confidence": "FACE_DETECT_CONFIDENCE",
+}
+
+
+class ModelNotAvailable(RuntimeError):
+    """Raised when the configured model file does not exist or cannot be loaded"""
+
+
+def load_config(path=None):
+    """Merge defaults, the optional JSON config file and environment overrides"""
+    config = dict(DEFAULT_CONFIG)
+    path = path or os.getenv("EMOTION_CONFIG", os.path.join(BASE_DIR, "emotion_config.json"))
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            config.update(json.load(f))
+    for key, env_name in ENV_OVERRIDES.items():
+        value = os.getenv(env_name)
+        if value is not None and value != "":
+            config[key] = value
+    if config["num_threads"] is not None:
+        config["num_threads"] = int(config["num_threads"])
+    if isinstance(config["warmup"], str):
+        config["warmup"] = config["warmup"].lower() in ("1", "true", "yes")
+    for key, cast in (("detect_max_side", int), ("detect_scale_factor", float),
+                      ("detect_min_neighbors", int), ("detect_confidence", float)):
+        config[key] = cast(config[key])
+    return config
+
+
+class ModelRegistry:
+    """Loads the emotion model and the face detector on first use instead of at import"""
+
+    def __init__(self, config=None):
+        self.config = config if config is not None else load_config()
+        self._model = None
+        self._face_detector = None
+        self._lock = threading.Lock()
+        self._warmup_thread = None
+
+    @property
+    def model_path(self):
+        return self.config["model_path"] or default_model_path(
+            self.config["backend"], self.config["keras_model_path"], self.config["model_variant"])
+
+    def is_loaded(self):
+        return self._model is not None
+
+    def get_model(self):
+        """Return the inference backend, loading it on the first call"""
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    path = self.model_path
+                    if not os.path.exists(path):
+                        raise ModelNotAvailable(f"Model file not found at {path}")
+                    self._model = load_backend(self.config["backend"], path, num_threads=self.config["num_threads"])
+                    print(f"Model loaded successfully ({self.config['backend']}: {path}).")
+        return self._model
+
+    def get_face_detector(self):
+        """Return the configured face detector (see face_detector.py), building it on the first call"""
+        if self._face_detector is None:
+            with self._lock:
+                if self._face_detector is None:
+                    try:
+                        self._face_detector = load_detector(self.config["face_detector"], **detector_kwargs(self.config))
+                    except FileNotFoundError as e:
+                        raise ModelNotAvailable(str(e))
+        return self._face_detector
+
+    def warm_up(self, background=True):
+        """Load the model and face detector and run one dummy batch, optionally on a background thread"""
+        if not background:
+            self._warm_up()
+            return None
+        if self._warmup_thread is None:
+            self._warmup_thread = threading.Thread(target=self._warm_up, name="model-warmup", daemon=True)
+            self._warmup_thread.start()
+        return self._warmup_thread
+
+    def _warm_up(self):
+        try:
+            self.get_face_detector()
+            self.get_model().predict(np.zeros((1, IMG_SIZE, IMG_SIZE, 3), dtype=np.float32))
+        except Exception as e:
+            print(f"❌ Model warm-up failed: {e}")
+
+    def reset(self):
+        """Forget loaded objects so the next call reloads them (e.g. after changing config)"""
+        with self._lock:
+            self._model = None
+            self._face_detector = None
+
+
+registry = ModelRegistry()
@@ -0,0 +1,153 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class RecommendationCache:
+    """In-memory TTL cache for recommendation results with stale-while-revalidate.
+
+    Fresh entries (younger than ttl) are returned directly. Entries older than ttl
+    but younger than ttl + stale_ttl are still returned immediately while a single
+    background thread refreshes them. Anything older, or missing, is loaded
+    synchronously; concurrent misses on the same key share one load. When
+    disk_path is set the entries are also persisted to a JSON file so a restarted
+    worker starts warm.
+    """
+
+    def __init__(self, ttl=3600, stale_ttl=86400, max_entries=128, disk_path=None):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.disk_path = disk_path
+        self._entries = OrderedDict()  # key -> (fetched_at, value)
+        self._lock = threading.Lock()
+        self._inflight = {}  # key -> Event set when a synchronous load finishes
+        self._refreshing = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        if disk_path:
+            self._load_from_disk()
+
+    def get(self, key, loader):
+        """Return the cached value for key, calling loader() to (re)build it when needed"""
+        while True:
+            now = time.time()
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    age = now - entry[0]
+                    if age < self.ttl:
+                        self.hits += 1
+                        self._entries.move_to_end(key)
+                        return entry[1]
+                    if age < self.ttl + self.stale_ttl:
+                        self.stale_hits += 1
+                        self._entries.move_to_end(key)
+                        self._schedule_refresh(key, loader)
+                        return entry[1]
+                inflight = self._inflight.get(key)
+                if inflight is None:
+                    self.misses += 1
+                    inflight = self._inflight[key] = threading.Event()
+                    break
+            # Another request is already loading this key, wait for it and re-check
+            inflight.wait()
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    return entry[1]
+            # The other load failed; retry so this caller gets its own result
+        try:
+            value = loader()
+            if value is not None:
+                self._store(key, value)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            inflight.set()
+
+    def invalidate(self, key=None):
+        """Drop one key, or every entry when key is None"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+        self._save_to_disk()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes,
+            }
+
+    def _schedule_refresh(self, key, loader):
+        # Called with self._lock held
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+        threading.Thread(target=self._refresh, args=(key, loader), name=f"recommendation-refresh-{key}", daemon=True).start()
+
+    def _refresh(self, key, loader):
+        try:
+            value = loader()
+            if value is not None:
+                self._store(key, value)
+                with self._lock:
+                    self.refreshes += 1
+        except Exception as e:
+            print(f"❌ Background refresh of {key} failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _store(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        self._save_to_disk()
+
+    def _load_from_disk(self):
+        if not os.path.exists(self.disk_path):
+            return
+        try:
+            with open(self.disk_path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"❌ Could not read recommendation cache {self.disk_path}: {e}")
+            return
+        for key, entry in data.items():
+            self._entries[key] = (entry["fetched_at"], entry["value"])
+
+    def _save_to_disk(self):
+        if not self.disk_path:
+            return
+        with self._lock:
+            data = {key: {"fetched_at": fetched_at, "value": value} for key, (fetched_at, value) in self._entries.items()}
+        tmp_path = f"{self.disk_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.disk_path)
+        except OSError as e:
+            print(f"❌ Could not write recommendation cache {self.disk_path}: {e}")
+
+
+# Shared by api.py and api2.py; keys are prefixed with the module so they never collide
+cache = RecommendationCache(
+    ttl=float(os.getenv("RECOMMENDATION_CACHE_TTL", "3600")),
+    stale_ttl=float(os.getenv("RECOMMENDATION_CACHE_STALE_TTL", "86400")),
+    max_entries=int(os.getenv("RECOMMENDATION_CACHE_MAX_ENTRIES", "128")),
+    disk_path=os.getenv("RECOMMENDATION_CACHE_FILE") or None,
+)
@@ -0,0 +1,121 @@
+"""Offline snapshot of the recommendations for every emotion.
+
+Build (or refresh) the snapshot, e.g. from cron or a systemd timer:
+    python recommendation_snapshot.py --output recommendations_snapshot.json.gz
+    python recommendation_snapshot.py --interval 3600      # keep refreshing every hour
+
+Serve from it with RECOMMENDATION_MODE=snapshot (and RECOMMENDATION_SNAPSHOT=<path>);
+recommend_media in api.py / api2.py then does no network I/O at all. The file is
+re-read automatically when the refresh job replaces it.
+"""
+import argparse
+import gzip
+import json
+import os
+import threading
+import time
+
+RECOMMENDATION_MODE = os.getenv("RECOMMENDATION_MODE", "live")
+SNAPSHOT_PATH = os.getenv("RECOMMENDATION_SNAPSHOT", "recommendations_snapshot.json.gz")
+
+
+def _open(path, mode, compressed=None):
+    if compressed is None:
+        compressed = path.endswith(".gz")
+    if compressed:
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+class RecommendationSnapshot:
+    """Read-only view of a snapshot file, reloaded when the file on disk changes"""
+
+    def __init__(self, path, check_interval=5.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._data = {}
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, source, emotion_id):
+        """Recommendations for an emotion from a source module ('api' or 'api2'), or None"""
+        self._maybe_reload()
+        return self._data.get(source, {}).get(str(emotion_id))
+
+    def generated_at(self):
+        self._maybe_reload()
+        return self._data.get("generated_at")
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval and self._mtime is not None:
+            return
+        with self._lock:
+            self._checked_at = now
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                if self._mtime is None:
+                    print(f"❌ Recommendation snapshot not found at {self.path}")
+                    self._mtime = 0
+                return
+            if mtime == self._mtime:
+                return
+            try:
+                with _open(self.path, "r") as f:
+                    self._data = json.load(f)
+                self._mtime = mtime
+            except (OSError, ValueError) as e:
+                print(f"❌ Could not read recommendation snapshot {self.path}: {e}")
+
+
+snapshot = RecommendationSnapshot(SNAPSHOT_PATH)
+
+
+def build_snapshot():
+    """Fetch the recommendations of every emotion from both api.py and api2.py"""
+    import api
+    import api2
+
+    data = {"generated_at": time.strftime("%Y-%m-%d %H:%M:%S")}
+    for source, module in (("api", api), ("api2", api2)):
+        data[source] = {}
+        for emotion_id in module.emotion_dict:
+            recommendations = module.fetch_recommendations(emotion_id)
+            if recommendations:
+                data[source][str(emotion_id)] = recommendations
+            else:
+                print(f"❌ No {source} recommendations for {module.emotion_dict[emotion_id]}, skipped")
+    return data
+
+
+def write_snapshot(data, path):
+    """Write the snapshot atomically so readers never see a half-written file"""
+    tmp_path = f"{path}.tmp"
+    with _open(tmp_path, "w", compressed=path.endswith(".gz")) as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-fetch recommendations for every emotion into a snapshot file")
+    parser.add_argument("--output", default=SNAPSHOT_PATH, help="Snapshot path (.json or .json.gz)")
+    parser.add_argument("--interval", type=float, default=None, help="Keep running and rebuild every N seconds")
+    args = parser.parse_args(argv)
+
+    while True:
+        data = build_snapshot()
+        count = sum(len(data[source]) for source in ("api", "api2"))
+        if count:
+            write_snapshot(data, args.output)
+            print(f"✅ Wrote {count} recommendation sets to {args.output}")
+        else:
+            print("❌ Nothing fetched, keeping the previous snapshot")
+        if args.interval is None:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
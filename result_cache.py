@@ -0,0 +1,143 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Rough per-entry bookkeeping (key, dict slot, Python objects) on top of the array and JPEG bytes
+ENTRY_OVERHEAD = 512
+
+
+class CachedResult:
+    """Detections of one uploaded image: decoded size, face boxes, emotion ids and class probabilities"""
+    __slots__ = ("width", "height", "faces", "ids", "probabilities", "jpeg")
+
+    def __init__(self, width, height, faces, ids, probabilities, jpeg=None):
+        self.width = width
+        self.height = height
+        self.faces = faces
+        self.ids = ids
+        self.probabilities = probabilities
+        self.jpeg = jpeg
+
+    @property
+    def nbytes(self):
+        return (ENTRY_OVERHEAD + self.faces.nbytes + self.probabilities.nbytes + 8 * len(self.ids)
+                + (len(self.jpeg) if self.jpeg else 0))
+
+
+def _frozen(array, dtype):
+    # Shared between requests, so nobody may modify it in place
+    array = np.array(array, dtype=dtype)
+    array.setflags(write=False)
+    return array
+
+
+class ResultCache:
+    """Bounded LRU of classification results keyed by a hash of the uploaded bytes.
+
+    Identical uploads (the same photo submitted again, test suites posting the
+    same file) skip decoding, detection and inference. The cache is capped both
+    by entry count and by an estimate of the memory held (arrays plus the
+    optional annotated JPEG); least recently used entries go first. Results
+    depend on the loaded model and detector settings, so call clear() after
+    changing them.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, max_entries=4096, store_jpeg=True):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.store_jpeg = store_jpeg
+        self._entries = OrderedDict()  # key -> CachedResult
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(data):
+        """Content hash of the raw upload bytes"""
+        return hashlib.blake2b(data, digest_size=16).digest()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0 and self.max_entries > 0
+
+    def get(self, key):
+        """The cached result for key, or None (counted as a miss)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, size, faces, ids, probabilities):
+        """Store the detections of an image of size (height, width); returns the CachedResult"""
+        height, width = size[:2]
+        entry = CachedResult(width, height, _frozen(faces, np.int32).reshape(-1, 4), tuple(ids),
+                             _frozen(probabilities, np.float32))
+        if self.enabled:
+            with self._lock:
+                self._insert(key, entry)
+        return entry
+
+    def set_jpeg(self, key, entry, jpeg):
+        """Attach the annotated JPEG to a cached result when JPEGs are kept and still fit"""
+        if not self.store_jpeg or entry.jpeg is not None:
+            return
+        with self._lock:
+            if self._entries.get(key) is not entry:
+                return
+            self._bytes += len(jpeg)
+            entry.jpeg = jpeg
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+            }
+
+    def _insert(self, key, entry):
+        # Called with self._lock held
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old.nbytes
+        if entry.nbytes > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self._bytes += entry.nbytes
+        self._evict()
+
+    def _evict(self):
+        # Called with self._lock held
+        while self._entries and (self._bytes > self.max_bytes or len(self._entries) > self.max_entries):
+            _, old = self._entries.popitem(last=False)
+            self._bytes -= old.nbytes
+            self.evictions += 1
+
+
+# RESULT_CACHE_MB=0 turns the cache off
+cache = ResultCache(
+    max_bytes=int(float(os.getenv("RESULT_CACHE_MB", "32")) * 1024 * 1024),
+    max_entries=int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "4096")),
+    store_jpeg=os.getenv("RESULT_CACHE_JPEG", "1") != "0",
+)
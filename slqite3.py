@@ -1,4 +1,4 @@
-import sqlite3
+from db import get_connection
 
 class DatabaseManager:
     def __init__(self, db_name="users.db"):
@@ -6,7 +6,8 @@ class DatabaseManager:
         self.create_tables()
 
     def connect(self):
-        return sqlite3.connect(self.db_name)
+        # Shares the WAL-mode connection pool with app.py; leaving the with-block returns it
+        return get_connection(self.db_name, row_factory=None)
 
     def create_tables(self):
         with self.connect() as conn:
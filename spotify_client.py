@@ -0,0 +1,214 @@
+import base64
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Both endpoints can be pointed at a local stub server for testing
+SPOTIFY_TOKEN_URL = os.getenv("SPOTIFY_TOKEN_URL", "https://accounts.spotify.com/api/token")
+SPOTIFY_API_URL = os.getenv("SPOTIFY_API_URL", "https://api.spotify.com/v1")
+
+# (connect, read) timeouts in seconds for every Spotify call
+REQUEST_TIMEOUT = (3.05, 10)
+
+
+def create_session(retries=3, backoff_factor=0.3, pool_maxsize=16):
+    """requests.Session with keep-alive connection pooling and retries with exponential backoff"""
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["GET", "POST"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Process-wide pooled session shared by every Spotify call"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+    return _session
+
+
+def api_url(path):
+    return f"{SPOTIFY_API_URL}/{path.lstrip('/')}"
+
+
+def authorized_get(url, token, params=None):
+    """GET over the pooled session with a bearer token.
+
+    token is an access token string, or a TokenManager: then a 401 (a token
+    revoked before its cached expiry) drops the cached token and the call is
+    retried once with a fresh one.
+    """
+    manager = token if isinstance(token, TokenManager) else None
+    access_token = manager.get_token() if manager else token
+    response = get_session().get(url, headers={"Authorization": f"Bearer {access_token}"},
+                                 params=params, timeout=REQUEST_TIMEOUT)
+    if response.status_code == 401 and manager is not None:
+        manager.invalidate(access_token)
+        access_token = manager.get_token()
+        if access_token:
+            response = get_session().get(url, headers={"Authorization": f"Bearer {access_token}"},
+                                         params=params, timeout=REQUEST_TIMEOUT)
+    return response
+
+
+def spotify_get(path, token, params=None):
+    """GET an endpoint of the Web API (path relative to SPOTIFY_API_URL), see authorized_get for token"""
+    return authorized_get(api_url(path), token, params=params)
+
+
+# Only the fields get_track_details maps, plus the pagination link
+PLAYLIST_TRACK_FIELDS = "items(track(name,artists(name),external_urls(spotify),album(images(url)))),next"
+# Largest page the playlist tracks endpoint accepts
+PLAYLIST_PAGE_LIMIT = 100
+
+
+def get_playlist_items(playlist_id, token, limit):
+    """Fetch the first limit items of a playlist, following next links when more than one page is needed.
+
+    Returns (items, error_response); error_response is the failed response when the
+    first page could not be fetched, None otherwise.
+    """
+    params = {"fields": PLAYLIST_TRACK_FIELDS, "limit": min(limit, PLAYLIST_PAGE_LIMIT), "offset": 0}
+    response = spotify_get(f"playlists/{playlist_id}/tracks", token, params=params)
+    items = []
+    while True:
+        if response.status_code != 200:
+            return items, (None if items else response)
+        data = response.json()
+        items.extend(item for item in data.get("items", []) if item.get("track"))
+        next_url = data.get("next")
+        if len(items) >= limit or not next_url:
+            return items[:limit], None
+        response = authorized_get(next_url, token)
+
+
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="spotify")
+
+
+def fetch_concurrently(*calls):
+    """Run independent (function, *args) calls in parallel and return their results in order"""
+    futures = [_executor.submit(call[0], *call[1:]) for call in calls]
+    return [future.result() for future in futures]
+
+
+class TokenManager:
+    """Thread-safe cache for the Spotify client-credentials access token.
+
+    The token is reused until refresh_margin seconds before the expiry reported
+    by Spotify in expires_in. When it has to be refreshed only one thread talks
+    to the accounts endpoint; the others wait on the lock and pick up its token.
+    """
+
+    def __init__(self, client_id, client_secret, token_url=None, refresh_margin=60):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.token_url = token_url or SPOTIFY_TOKEN_URL
+        self.refresh_margin = refresh_margin
+        self._token = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.failures = 0
+
+    def _valid(self, now):
+        return self._token is not None and now < self._expires_at - self.refresh_margin
+
+    def get_token(self):
+        """Return a valid access token, fetching a new one only when the cached one is about to expire"""
+        if self._valid(time.monotonic()):
+            self.hits += 1
+            return self._token
+        with self._lock:
+            # Another thread may have refreshed the token while this one waited
+            if self._valid(time.monotonic()):
+                self.hits += 1
+                return self._token
+            self.misses += 1
+            token, expires_in = self._request_token()
+            if token is None:
+                self.failures += 1
+                return None
+            self._token = token
+            self._expires_at = time.monotonic() + expires_in
+            self.refreshes += 1
+            return token
+
+    def invalidate(self, token=None):
+        """Forget the cached token, e.g. after the API answered 401.
+
+        With token, only forget it if it is still the cached one, so a token
+        another thread already replaced is kept.
+        """
+        with self._lock:
+            if token is not None and token != self._token:
+                return
+            self._token = None
+            self._expires_at = 0.0
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "expires_in": max(0.0, self._expires_at - time.monotonic()) if self._token else 0.0,
+        }
+
+    def _request_token(self):
+        auth_string = f"{self.client_id}:{self.client_secret}"
+        auth_base64 = base64.b64encode(auth_string.encode("utf-8")).decode("utf-8")
+        headers = {
+            "Authorization": "Basic " + auth_base64,
+            "Content-Type": "application/x-www-form-urlencoded"
+        }
+        data = {"grant_type": "client_credentials"}
+        try:
+            result = get_session().post(self.token_url, headers=headers, data=data, timeout=REQUEST_TIMEOUT)
+        except requests.RequestException as e:
+            print(f"❌ Token request failed: {e}")
+            return None, 0
+        if result.status_code != 200:
+            print(f"❌ Failed Request (Status {result.status_code}):", result.text)
+            return None, 0
+        json_result = result.json()
+        token = json_result.get("access_token")
+        if not token:
+            print("❌ Token retrieval failed. Response:", json_result)
+            return None, 0
+        return token, float(json_result.get("expires_in", 3600))
+
+
+_token_managers = {}
+_token_managers_lock = threading.Lock()
+
+
+def get_token_manager(client_id, client_secret):
+    """Process-wide TokenManager for a set of credentials, shared by api.py and api2.py"""
+    key = (client_id, client_secret)
+    with _token_managers_lock:
+        manager = _token_managers.get(key)
+        if manager is None:
+            manager = _token_managers[key] = TokenManager(client_id, client_secret)
+        return manager
@@ -0,0 +1,226 @@
+"""Per-second emotion timeline of a local video file.
+
+Usage:
+    python video_timeline.py clip.mp4
+    python video_timeline.py clip.mp4 --fps 4 --detect-threads 3 --json timeline.json --recommend
+
+Frames are sampled at --fps and flow through three stages on separate
+threads: decoding (cv2.VideoCapture), face detection and preprocessing
+(several threads; OpenCV releases the GIL), and batched inference. Each
+second of video gets the count of every emotion detected in its sampled
+frames (empty, with no dominant emotion, when no face was found); the
+dominant emotion over the whole video can be fed straight into
+recommend_media (--recommend).
+"""
+import argparse
+import json
+import math
+import queue
+import threading
+import time
+from collections import Counter
+
+import cv2
+import numpy as np
+
+from face_detector import detector_kwargs, load_detector
+from face_pipeline import emotion_mapping, preprocess_faces
+from model_registry import registry
+
+_DONE = object()
+
+
+class _Stop(Exception):
+    pass
+
+
+def _put(q, item, stop):
+    """Blocking put that gives up once another stage has failed"""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+    raise _Stop()
+
+
+def analyze_video(path, detector_factory, predict_fn, sample_fps=2.0, detect_threads=2, batch_size=32, queue_size=16):
+    """Decode, detect and classify a video; returns the timeline dict (see summarize).
+
+    detector_factory() is called once per detect thread, so no detector is
+    shared between threads.
+    """
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError(f"Cannot open video: {path}")
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    step = max(1, round(fps / sample_fps)) if sample_fps else 1
+    frames_q = queue.Queue(maxsize=queue_size)
+    faces_q = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors = []
+    stats = {"frames": 0, "sampled": 0}
+
+    def decode():
+        try:
+            index = 0
+            while capture.grab():
+                if index % step == 0:
+                    ok, frame = capture.retrieve()
+                    if ok:
+                        _put(frames_q, (index / fps, cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)), stop)
+                        stats["sampled"] += 1
+                index += 1
+            stats["frames"] = index
+        except _Stop:
+            pass
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            capture.release()
+            for _ in range(detect_threads):
+                try:
+                    _put(frames_q, _DONE, stop)
+                except _Stop:
+                    break
+
+    def detect():
+        try:
+            detector = detector_factory()
+            while True:
+                try:
+                    item = frames_q.get(timeout=0.1)
+                except queue.Empty:
+                    if stop.is_set():
+                        break
+                    continue
+                if item is _DONE:
+                    break
+                ts, gray = item
+                boxes = detector.detect(gray)
+                # A fresh batch per frame: it is handed to another thread
+                batch = preprocess_faces(gray, boxes) if len(boxes) else None
+                _put(faces_q, (ts, batch), stop)
+        except _Stop:
+            pass
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            try:
+                _put(faces_q, _DONE, stop)
+            except _Stop:
+                pass
+
+    threads = [threading.Thread(target=decode, name="video-decode", daemon=True)]
+    threads += [threading.Thread(target=detect, name=f"video-detect-{i}", daemon=True) for i in range(detect_threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+
+    # Inference runs here: face batches of several frames go through the model together
+    detections = []  # (timestamp, emotion id, confidence)
+    pending, pending_faces, finished = [], 0, 0
+
+    def flush():
+        batch = np.concatenate([b for _, b in pending])
+        predictions = np.asarray(predict_fn(batch))
+        offset = 0
+        for ts, b in pending:
+            for probs in predictions[offset:offset + len(b)]:
+                top = int(np.argmax(probs))
+                detections.append((ts, top, float(probs[top])))
+            offset += len(b)
+
+    try:
+        while finished < detect_threads and not stop.is_set():
+            try:
+                item = faces_q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                finished += 1
+                continue
+            ts, batch = item
+            if batch is None:
+                continue
+            pending.append((ts, batch))
+            pending_faces += len(batch)
+            if pending_faces >= batch_size:
+                flush()
+                pending, pending_faces = [], 0
+        if pending and not stop.is_set():
+            flush()
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+    duration = stats["frames"] / fps
+    return summarize(detections, duration, fps, stats["sampled"], time.perf_counter() - started)
+
+
+def summarize(detections, duration, fps, sampled, processing_s):
+    """Per-second emotion counts, the dominant emotion per second and over the whole video.
+
+    Every second from 0 to the end of the video has an entry; seconds without
+    a detected face have empty counts and a None dominant emotion.
+    """
+    seconds = [Counter() for _ in range(math.ceil(duration))]
+    for ts, emotion_id, _ in detections:
+        second = int(ts)
+        seconds.extend(Counter() for _ in range(second + 1 - len(seconds)))
+        seconds[second][emotion_id] += 1
+    timeline = [{
+        "second": second,
+        "counts": {emotion_mapping[idx]: count for idx, count in sorted(counts.items())},
+        "dominant": emotion_mapping[counts.most_common(1)[0][0]] if counts else None,
+    } for second, counts in enumerate(seconds)]
+    totals = Counter(emotion_id for _, emotion_id, _ in detections)
+    dominant_id = totals.most_common(1)[0][0] if totals else None
+    return {
+        "duration_s": round(duration, 2),
+        "video_fps": round(fps, 2),
+        "sampled_frames": sampled,
+        "faces": len(detections),
+        "processing_s": round(processing_s, 2),
+        "realtime_factor": round(duration / processing_s, 2) if processing_s else None,
+        "dominant_emotion_id": dominant_id,
+        "dominant_emotion": emotion_mapping.get(dominant_id),
+        "totals": {emotion_mapping[idx]: count for idx, count in sorted(totals.items())},
+        "timeline": timeline,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-second emotion timeline of a video file")
+    parser.add_argument("video", help="Local video file")
+    parser.add_argument("--fps", type=float, default=2.0, help="Frames sampled per second of video")
+    parser.add_argument("--detect-threads", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=32, help="Faces per model call")
+    parser.add_argument("--json", default=None, help="Write the timeline as JSON")
+    parser.add_argument("--recommend", action="store_true", help="Fetch recommendations for the dominant emotion")
+    args = parser.parse_args(argv)
+
+    config = registry.config
+    result = analyze_video(args.video, lambda: load_detector(config["face_detector"], **detector_kwargs(config)),
+                           registry.get_model().predict,
+                           sample_fps=args.fps, detect_threads=args.detect_threads, batch_size=args.batch_size)
+    for entry in result["timeline"]:
+        counts = ", ".join(f"{label}: {count}" for label, count in entry["counts"].items())
+        print(f"{entry['second']:>5}s  {entry['dominant'] or '-':<9} ({counts})")
+    print(f"✅ Dominant emotion: {result['dominant_emotion'] or 'none'} "
+          f"({result['duration_s']} s of video in {result['processing_s']} s, {result['realtime_factor']}x real time)")
+    if args.recommend and result["dominant_emotion_id"] is not None:
+        from api import recommend_media
+        result["recommendations"] = recommend_media(result["dominant_emotion_id"])
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
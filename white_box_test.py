@@ -3,7 +3,38 @@ import sqlite3
 import cv2
 import numpy as np
 import io
+import contextlib
+import struct
+import os
+from unittest import mock
 from flask import Flask
+import threading
+import tempfile
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import time
+from inference_server import BatchScheduler
+from face_pipeline import FaceBatchBuffer, preprocess_faces
+from inference_backends import default_model_path, load_backend
+from recommendation_cache import RecommendationCache
+from recommendation_snapshot import RecommendationSnapshot, write_snapshot
+import api2
+import spotify_client
+from spotify_client import TokenManager
+import db
+from log_writer import LogWriter
+from emotion_logs import create_log_schema, insert_logs, parse_date_bound, query_logs
+from analytics import emotion_distribution, emotion_totals, rebuild_rollups
+from live_sessions import MemoryLiveSessionStore, create_store
+from live_socket import serve_frames
+from face_tracker import FaceTracker, iou
+from face_detector import HaarDetector, load_detector
+from result_cache import ResultCache
+from image_io import ImageTooLarge, decode_factor, decode_image, image_size, read_upload
+import batch_classify
+from video_timeline import analyze_video
+from migrate_logs import has_legacy_logs, migrate_legacy_logs
+from model_registry import DEFAULT_CONFIG, ModelNotAvailable, ModelRegistry, registry as model_registry
 
 # Import internal functions and variables from app.py
 from app import (
@@ -11,19 +42,57 @@ from app import (
     validate_password,
     get_db_connection,
     init_db,
-    face_cascade,
+    get_face_detector,
     img_size,
     predict_emotion_from_image,
+    predict_emotions_from_image,
     recommend_media,
+    classify_faces,
+    classify_upload,
+    upload_executor,
     app
 )
 
 def detect_face(img):
     """ Detects a face in the image and returns a bounding box. """
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    faces = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
+    faces = get_face_detector().detect(gray)
     return faces
 
+class StubSpotifyHandler(BaseHTTPRequestHandler):
+    """ Minimal stand-in for the Spotify accounts and Web API endpoints. """
+    protocol_version = "HTTP/1.1"
+    requests_seen = []
+    connections = set()
+
+    def _send_json(self, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.requests_seen.append(self.path)
+        self.connections.add(self.client_address)
+        self._send_json({"access_token": "stub-token", "expires_in": 3600})
+
+    def do_GET(self):
+        self.requests_seen.append(self.path)
+        self.connections.add(self.client_address)
+        if "/playlists/" in self.path:
+            track = {"name": "Song", "artists": [{"name": "Artist"}],
+                     "external_urls": {"spotify": "https://open.spotify.com/track/x"},
+                     "album": {"images": [{"url": "https://i.scdn.co/image/x"}]}}
+            self._send_json({"items": [{"track": track}] * 2, "next": None})
+        else:
+            self._send_json({"items": [{"name": "Episode", "show": {"publisher": "Publisher"}}]})
+
+    def log_message(self, *args):
+        pass
+
 class WhiteBoxTest(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -47,6 +116,116 @@ class WhiteBoxTest(unittest.TestCase):
         self.assertIsNotNone(table, "Users table should exist after initialization.")
         conn.close()
         
+    def test_db_connections_are_pooled_and_use_wal(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "pool.db")
+            conn = db.get_connection(path)
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+            self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)  # NORMAL
+            conn.execute("CREATE TABLE t (x INTEGER)")
+            conn.execute("INSERT INTO t VALUES (1)")
+            conn.close()  # uncommitted insert is rolled back on release
+            again = db.get_connection(path)
+            self.assertIs(again, conn)
+            self.assertEqual(again.execute("SELECT COUNT(*) FROM t").fetchone()[0], 0)
+            with again:
+                again.execute("INSERT INTO t VALUES (2)")
+            self.assertIs(db.get_connection(path), conn, "Leaving a with-block returns the connection.")
+            conn.close()
+            db.close_all(path)
+
+    def test_log_writer_batches_and_drains_on_shutdown(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "logs.db")
+            conn = db.get_connection(path)
+            conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, email TEXT)")
+            create_log_schema(conn)
+            writer = LogWriter(path, batch_size=100, flush_interval=0.05)
+            media = [(0, "Song", "Artist"), (1, "Episode", "Publisher")]
+            for i in range(250):
+                writer.submit(1, i % 7, 1700000000 + i, media)
+            writer.shutdown()
+            self.assertEqual(writer.stats()["written"], 250)
+            self.assertLessEqual(writer.stats()["transactions"], 10)
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM emotion_logs").fetchone()[0], 250)
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM media_sets").fetchone()[0], 1,
+                             "Identical recommendation lists are stored once.")
+            conn.close()
+            db.close_all(path)
+
+    def test_migrate_legacy_logs(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "legacy.db")
+            conn = db.get_connection(path)
+            conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, email TEXT)")
+            conn.execute("CREATE TABLE logs (id INTEGER PRIMARY KEY AUTOINCREMENT, email TEXT NOT NULL, emotion TEXT, datetime TEXT, playlist TEXT)")
+            conn.execute("INSERT INTO users (id, email) VALUES (7, 'TEST_legacy@example.com')")
+            playlist = "Music: Song A by Artist, Song B by Other; Podcasts: Episode by Publisher"
+            conn.executemany("INSERT INTO logs (email, emotion, datetime, playlist) VALUES (?, ?, ?, ?)", [
+                ("TEST_legacy@example.com", "happy", "2025-01-02 10:00:00", playlist),
+                ("gone@example.com", "Unknown Emotion", "2025-01-01 10:00:00", "Music: No music; Podcasts: No podcasts"),
+                ("TEST_legacy@example.com", "sad", "yesterday", playlist),
+            ])
+            conn.commit()
+            self.assertTrue(has_legacy_logs(conn))
+            self.assertEqual(migrate_legacy_logs(conn, drop_legacy=True), (2, [3]),
+                             "A row with an unparseable datetime is reported, not stored at epoch 0.")
+            self.assertFalse(has_legacy_logs(conn))
+            self.assertEqual(conn.execute("SELECT datetime FROM logs_legacy WHERE id = 3").fetchone()[0], "yesterday",
+                             "The legacy table is kept while it holds skipped rows.")
+            logs, _ = query_logs(conn)
+            self.assertEqual([(log["email"], log["emotion"], log["datetime"]) for log in logs],
+                             [("TEST_legacy@example.com", "happy", "2025-01-02 10:00:00"),
+                              ("unknown", "Unknown Emotion", "2025-01-01 10:00:00")])
+            self.assertEqual(logs[0]["playlist"], playlist)
+            conn.close()
+            db.close_all(path)
+
+    def test_analytics_rollups_match_logs(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "analytics.db")
+            conn = db.get_connection(path)
+            conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, email TEXT)")
+            create_log_schema(conn)
+            day = 1735689600  # 2025-01-01 00:00 UTC
+            records = [(1, 3, day + 600, []), (1, 3, day + 1200, []), (1, 5, day + 3 * 3600, []),
+                       (2, 3, day + 86400 + 60, []), (None, None, day + 60, [])]
+            insert_logs(conn, records[:2])
+            insert_logs(conn, records[2:])
+            conn.commit()
+
+            daily = emotion_distribution(conn, "day")
+            self.assertEqual([bucket["bucket"] for bucket in daily], ["2025-01-01", "2025-01-02"])
+            self.assertEqual(daily[0]["counts"], {"neutral": 2, "happy": 1, "unknown": 1})
+            hourly = emotion_distribution(conn, "hour", user_id=1)
+            self.assertEqual([(bucket["bucket"], bucket["counts"]) for bucket in hourly],
+                             [("2025-01-01 00:00", {"neutral": 2}), ("2025-01-01 03:00", {"happy": 1})])
+            self.assertEqual(emotion_totals(emotion_distribution(conn, "day", start=day + 86400)), {"neutral": 1})
+
+            # Analytics bounds are UTC like the buckets, whatever the server's time zone
+            original_tz = os.environ.get("TZ")
+            os.environ["TZ"] = "America/New_York"
+            time.tzset()
+            try:
+                start = parse_date_bound("2025-01-01", utc=True)
+                end = parse_date_bound("2025-01-01", end=True, utc=True)
+            finally:
+                if original_tz is None:
+                    os.environ.pop("TZ")
+                else:
+                    os.environ["TZ"] = original_tz
+                time.tzset()
+            self.assertEqual((start, end), (day, day + 86399))
+            self.assertEqual([bucket["bucket"] for bucket in emotion_distribution(conn, "day", start=start, end=end)],
+                             ["2025-01-01"])
+
+            incremental = {granularity: emotion_distribution(conn, granularity) for granularity in ("hour", "day")}
+            rebuild_rollups(conn)
+            self.assertEqual({granularity: emotion_distribution(conn, granularity) for granularity in ("hour", "day")},
+                             incremental, "Backfill and incremental updates must agree.")
+            conn.close()
+            db.close_all(path)
+
     def test_detect_face_no_face(self):
         dummy_img = np.zeros((img_size, img_size, 3), dtype=np.uint8)
         faces = detect_face(dummy_img)
@@ -57,6 +236,336 @@ class WhiteBoxTest(unittest.TestCase):
         annotated_img, emotion_id = predict_emotion_from_image(dummy_img)
         self.assertIsNone(emotion_id, "No face should return None emotion.")
     
+    def test_predict_emotions_single_batch(self):
+        if not os.path.exists("img.jpg"):
+            self.skipTest("img.jpg not available")
+        img = cv2.imread("img.jpg")
+        faces = get_face_detector().detect(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+        fake_model = mock.Mock()
+        fake_model.predict.side_effect = lambda batch, verbose=0: np.tile(np.eye(7)[5], (len(batch), 1))
+        with mock.patch.object(model_registry, "get_model", return_value=fake_model):
+            annotated_img, emotions = predict_emotions_from_image(img)
+        self.assertEqual(emotions, [5] * len(faces))
+        if len(faces):
+            fake_model.predict.assert_called_once()
+            self.assertEqual(fake_model.predict.call_args[0][0].shape, (len(faces), img_size, img_size, 3))
+
+    def test_preprocess_faces_into_reused_buffer(self):
+        gray = np.random.default_rng(1).integers(0, 255, (240, 320), dtype=np.uint8)
+        faces = [(10, 10, 100, 100), (150, 60, 80, 90)]
+        expected = np.stack([np.stack((cv2.resize(gray[y:y+h, x:x+w], (img_size, img_size)),) * 3, axis=-1) / 255.0
+                             for x, y, w, h in faces]).astype(np.float32)
+        buffer = FaceBatchBuffer(capacity=1)
+        batch = preprocess_faces(gray, faces, buffer)
+        self.assertEqual(batch.dtype, np.float32)
+        np.testing.assert_array_equal(batch, expected)
+        again = preprocess_faces(gray, faces[:1], buffer)
+        self.assertTrue(np.shares_memory(batch, again), "The buffer is reused once it is large enough.")
+        np.testing.assert_array_equal(preprocess_faces(gray, faces), expected)
+
+    def test_batch_scheduler_groups_concurrent_requests(self):
+        calls = []
+        def fake_predict(batch):
+            calls.append(len(batch))
+            return batch.reshape(len(batch), -1)[:, :1] * 2
+        scheduler = BatchScheduler(fake_predict, max_batch_size=64, max_delay_ms=50)
+        results = {}
+        def worker(i):
+            faces = np.full((2, 1, 1, 1), i, dtype=np.float32)
+            results[i] = scheduler.predict(faces, timeout=5)
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        scheduler.shutdown()
+        self.assertEqual(sum(calls), 16)
+        self.assertLess(len(calls), 8, "Concurrent submissions should share model calls.")
+        for i in range(8):
+            self.assertEqual(results[i].tolist(), [[i * 2.0], [i * 2.0]])
+
+    def test_haar_detector_is_thread_safe(self):
+        image = cv2.imread("img.jpg", cv2.IMREAD_GRAYSCALE) if os.path.exists("img.jpg") else None
+        if image is None:
+            image = np.zeros((480, 640), dtype=np.uint8)
+        detector = HaarDetector(max_side=800)
+        expected = detector.detect(image).tolist()
+        results, errors = [], []
+        def worker():
+            try:
+                for _ in range(4):
+                    results.append(detector.detect(image).tolist())
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=worker) for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(results, [expected] * 24, "Concurrent detections match a single-threaded run.")
+
+    def test_batch_scheduler_survives_mismatched_batches(self):
+        scheduler = BatchScheduler(lambda batch: batch.reshape(len(batch), -1)[:, :1], max_batch_size=64, max_delay_ms=50)
+        futures = [scheduler.submit(np.zeros((1, 2, 2, 1), dtype=np.float32)),
+                   scheduler.submit(np.zeros((1, 3, 3, 1), dtype=np.float32))]
+        for future in futures:
+            with self.assertRaises(ValueError):
+                future.result(timeout=5)
+        self.assertEqual(scheduler.predict(np.ones((1, 2, 2, 1), dtype=np.float32), timeout=5).tolist(), [[1.0]],
+                         "The worker keeps serving after a failed batch.")
+        scheduler.shutdown()
+
+    def test_inference_timeout_excludes_model_load(self):
+        model = mock.Mock(predict=lambda batch: np.ones((len(batch), 7), dtype=np.float32))
+        loaded = []
+        def slow_load():
+            if not loaded:
+                time.sleep(0.3)  # only the first call loads, like the registry
+                loaded.append(model)
+            return model
+        scheduler = BatchScheduler(lambda batch: model_registry.get_model().predict(batch))
+        with mock.patch('app.INFERENCE_BATCHING', True), mock.patch('app.INFERENCE_TIMEOUT', 0.1), \
+                mock.patch('app.inference_scheduler', scheduler), \
+                mock.patch.object(model_registry, 'get_model', side_effect=slow_load):
+            self.assertEqual(classify_faces(np.zeros((2, 1, 1, 1), dtype=np.float32)).shape, (2, 7))
+        scheduler.shutdown()
+        with mock.patch('app.classify_image', side_effect=TimeoutError()):
+            response = self.client.post('/upload_image', data={'file': (io.BytesIO(cv2.imencode('.jpg', np.zeros((8, 8, 3), dtype=np.uint8))[1].tobytes()), 'x.jpg')},
+                                        content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 503)
+
+    def test_face_detector_downscaled_pass(self):
+        gray = np.full((1200, 1600), 200, dtype=np.uint8)
+        detector = HaarDetector(max_side=400, cascade=mock.Mock(detectMultiScale=mock.Mock(return_value=np.array([[100, 50, 40, 40]]))))
+        boxes = detector.detect(gray)
+        scaled = detector.cascade.detectMultiScale.call_args[0][0]
+        self.assertEqual(scaled.shape, (300, 400), "Detection runs on the downscaled image.")
+        self.assertEqual(boxes.tolist(), [[400, 200, 160, 160]], "Boxes are mapped back to full resolution.")
+        if os.path.exists("img.jpg"):
+            image = cv2.imread("img.jpg", cv2.IMREAD_GRAYSCALE)
+            full = HaarDetector(max_side=0).detect(image)
+            small = HaarDetector(max_side=800).detect(image)
+            largest = max(full, key=lambda box: box[2] * box[3])
+            self.assertTrue(any(iou(tuple(largest), tuple(box)) >= 0.5 for box in small))
+        with self.assertRaises(FileNotFoundError):
+            load_detector("dnn", model_path="missing.caffemodel")
+        with self.assertRaises(ValueError):
+            load_detector("nope")
+
+    def test_batch_classify_resumes_from_checkpoint(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            images = os.path.join(tmp, "images")
+            os.makedirs(images)
+            for i in range(3):
+                cv2.imwrite(os.path.join(images, f"blank{i}.jpg"), np.zeros((64, 64, 3), dtype=np.uint8))
+            with open(os.path.join(images, "broken.jpg"), "wb") as f:
+                f.write(b"not an image")
+            if os.path.exists("img.jpg"):
+                cv2.imwrite(os.path.join(images, "face.jpg"), cv2.imread("img.jpg"))
+            output = os.path.join(tmp, "out.jsonl")
+            predict_calls = []
+
+            def predict(batch):
+                predict_calls.append(batch.shape)
+                return np.tile(np.eye(7, dtype=np.float32)[3], (len(batch), 1))
+
+            paths = list(batch_classify.iter_paths(images))
+            images_done, _ = batch_classify.run(paths[:2], output, predict, "haar", {}, workers=0, batch_size=4)
+            self.assertEqual(images_done, 2)
+            images_done, faces = batch_classify.run(paths, output, predict, "haar", {}, workers=0, batch_size=4)
+            self.assertEqual(images_done, len(paths) - 2, "Images in the checkpoint are skipped.")
+            with open(output, encoding="utf-8") as f:
+                rows = [json.loads(line) for line in f]
+            self.assertEqual(sorted({row["path"] for row in rows}), sorted(paths))
+            self.assertEqual(next(row for row in rows if row["path"].endswith("broken.jpg"))["error"], "unreadable image")
+            self.assertTrue(all(row["emotion"] == "neutral" for row in rows if row["face"] is not None))
+            self.assertTrue(all(shape[1:] == (img_size, img_size, 3) for shape in predict_calls))
+
+    def test_batch_classify_reports_progress_once_per_step(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for i in range(20):
+                cv2.imwrite(os.path.join(tmp, f"blank{i:02d}.jpg"), np.zeros((32, 32, 3), dtype=np.uint8))
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out):
+                # Faceless images flush every 4 * batch_size = 4 images: 4, 8, 12, 16, 20
+                batch_classify.run(list(batch_classify.iter_paths(tmp)), os.path.join(tmp, "out.csv"), None, "haar", {},
+                                   workers=0, batch_size=1, progress_every=6)
+        counts = [int(line.split()[0]) for line in out.getvalue().splitlines()]
+        self.assertEqual(counts, [8, 12, 20])
+
+    def test_batch_classify_bounds_work_in_flight(self):
+        consumed = []
+
+        class FakePool:
+            # Finishes every task at once, like workers far ahead of inference
+            submitted = peak = 0
+
+            def apply_async(self, fn, args, callback, error_callback):
+                self.submitted += 1
+                self.peak = max(self.peak, self.submitted - len(consumed))
+                callback((args[0], None, None, None))
+
+        pool = FakePool()
+        for result in batch_classify._bounded_results(pool, (f"img{i}.jpg" for i in range(50)), window=5):
+            consumed.append(result[0])
+        self.assertEqual(sorted(consumed), sorted(f"img{i}.jpg" for i in range(50)))
+        self.assertLessEqual(pool.peak, 5, "No more than the window is submitted ahead of the consumer.")
+
+    def test_video_timeline_samples_and_summarizes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "clip.avi")
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 10, (160, 120))
+            if not writer.isOpened():
+                self.skipTest("No video encoder available")
+            for i in range(30):
+                writer.write(np.full((120, 160, 3), 40 if i < 20 else 220, dtype=np.uint8))
+            writer.release()
+            # Faces only in the dark frames, so the last second has none
+            detector = mock.Mock(detect=lambda gray: np.array([[10, 10, 60, 60]]) if gray.mean() < 128 else np.empty((0, 4)))
+            factory = mock.Mock(return_value=detector)
+            batches = []
+
+            def predict(batch):
+                batches.append(len(batch))
+                # Dark frames are "happy", bright ones "neutral"
+                return np.array([np.eye(7)[5 if face.mean() < 0.5 else 3] for face in batch])
+
+            result = analyze_video(path, factory, predict, sample_fps=2, detect_threads=2, batch_size=3)
+            self.assertEqual(factory.call_count, 2, "Each detect thread builds its own detector.")
+            self.assertEqual(result["sampled_frames"], 6)
+            self.assertEqual([entry["second"] for entry in result["timeline"]], [0, 1, 2])
+            self.assertEqual([entry["dominant"] for entry in result["timeline"]], ["happy", "happy", None])
+            self.assertEqual(result["timeline"][2]["counts"], {})
+            self.assertEqual(result["dominant_emotion"], "happy")
+            self.assertEqual(sum(batches), 4)
+            self.assertGreater(max(batches), 1, "Faces from several frames share a model call.")
+        with self.assertRaises(ValueError):
+            analyze_video("missing.mp4", factory, predict)
+
+    def test_inference_backend_selection(self):
+        self.assertEqual(default_model_path("keras", os.path.join("models", "model.h5")), os.path.join("models", "model.h5"))
+        self.assertEqual(default_model_path("onnx", os.path.join("models", "model.h5")), os.path.join("models", "model.onnx"))
+        self.assertEqual(default_model_path("tflite", os.path.join("models", "model.h5"), "float16"), os.path.join("models", "model_fp16.tflite"))
+        with self.assertRaises(ValueError):
+            load_backend("caffe", "model.caffemodel")
+
+    def test_model_registry_is_lazy(self):
+        registry = ModelRegistry(dict(DEFAULT_CONFIG, keras_model_path="does_not_exist.h5"))
+        self.assertFalse(registry.is_loaded())
+        with self.assertRaises(ModelNotAvailable):
+            registry.get_model()
+
+    def test_recommendation_cache_ttl_and_stale_refresh(self):
+        calls = []
+        def loader():
+            calls.append(1)
+            return {"call": len(calls)}
+        cache = RecommendationCache(ttl=0.05, stale_ttl=60)
+        self.assertEqual(cache.get("api:0", loader), {"call": 1})
+        self.assertEqual(cache.get("api:0", loader), {"call": 1})
+        time.sleep(0.06)
+        self.assertEqual(cache.get("api:0", loader), {"call": 1}, "Stale entries are served immediately.")
+        for _ in range(50):
+            if cache.stats()["refreshes"]:
+                break
+            time.sleep(0.01)
+        self.assertEqual(cache.get("api:0", loader), {"call": 2})
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_recommendation_cache_persists_to_disk(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "recommendations.json")
+            RecommendationCache(disk_path=path).get("api:5", lambda: {"emotion": "happy"})
+            warm = RecommendationCache(disk_path=path)
+            self.assertEqual(warm.get("api:5", lambda: None), {"emotion": "happy"})
+            self.assertEqual(warm.stats()["hits"], 1)
+
+    def test_token_manager_single_flight_refresh(self):
+        manager = TokenManager("id", "secret", refresh_margin=60)
+        def slow_request():
+            time.sleep(0.05)
+            return "token-%d" % manager.refreshes, 3600
+        with mock.patch.object(manager, "_request_token", side_effect=slow_request) as request_token:
+            threads = [threading.Thread(target=manager.get_token) for _ in range(10)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            self.assertEqual(manager.get_token(), "token-0")
+            self.assertEqual(request_token.call_count, 1)
+        stats = manager.stats()
+        self.assertEqual((stats["misses"], stats["refreshes"], stats["hits"]), (1, 1, 10))
+
+    def test_token_manager_refreshes_before_expiry(self):
+        manager = TokenManager("id", "secret", refresh_margin=60)
+        with mock.patch.object(manager, "_request_token", side_effect=[("short", 30), ("long", 3600)]):
+            self.assertEqual(manager.get_token(), "short")
+            self.assertEqual(manager.get_token(), "long", "A token inside the refresh margin is replaced.")
+
+    def test_revoked_token_is_replaced_and_retried(self):
+        manager = TokenManager("id", "secret")
+        session = mock.Mock()
+        session.get.side_effect = [mock.Mock(status_code=401), mock.Mock(status_code=200)]
+        with mock.patch.object(manager, "_request_token", side_effect=[("revoked", 3600), ("fresh", 3600)]), \
+             mock.patch.object(spotify_client, "get_session", return_value=session):
+            response = spotify_client.spotify_get("shows/x/episodes", manager)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([call.kwargs["headers"]["Authorization"] for call in session.get.call_args_list],
+                         ["Bearer revoked", "Bearer fresh"])
+        manager.invalidate("revoked")
+        self.assertEqual(manager.get_token(), "fresh", "A stale invalidate keeps the newer token.")
+
+    def test_spotify_calls_use_pooled_concurrent_client(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StubSpotifyHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = "http://127.0.0.1:%d" % server.server_port
+        StubSpotifyHandler.requests_seen, StubSpotifyHandler.connections = [], set()
+        try:
+            with mock.patch.object(spotify_client, "SPOTIFY_API_URL", base + "/v1"), \
+                 mock.patch.object(spotify_client, "SPOTIFY_TOKEN_URL", base + "/api/token"), \
+                 mock.patch.dict(spotify_client._token_managers, clear=True), \
+                 mock.patch.object(spotify_client, "_session", None):
+                for _ in range(3):
+                    recommendations = api2.fetch_recommendations(5)
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(len(recommendations["music"]), 4)
+        self.assertEqual(recommendations["podcasts"][0]["publisher"], "Publisher")
+        self.assertEqual(StubSpotifyHandler.requests_seen.count("/api/token"), 1)
+        self.assertEqual(len(StubSpotifyHandler.requests_seen), 10)
+        self.assertLess(len(StubSpotifyHandler.connections), len(StubSpotifyHandler.requests_seen),
+                        "Connections should be kept alive and reused.")
+
+    def test_recommendation_snapshot_reload(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "snapshot.json.gz")
+            write_snapshot({"api": {"5": {"emotion": "happy"}}, "api2": {}}, path)
+            snapshot = RecommendationSnapshot(path, check_interval=0)
+            self.assertEqual(snapshot.get("api", 5), {"emotion": "happy"})
+            self.assertIsNone(snapshot.get("api2", 5))
+            write_snapshot({"api": {"5": {"emotion": "happy", "music": []}}}, path)
+            os.utime(path, (time.time() + 10, time.time() + 10))
+            self.assertEqual(snapshot.get("api", 5), {"emotion": "happy", "music": []})
+
+    def test_playlist_items_filtered_and_paginated(self):
+        def page(count, next_url):
+            response = mock.Mock(status_code=200)
+            response.json.return_value = {"items": [{"track": {"name": "t"}}] * count, "next": next_url}
+            return response
+        session = mock.Mock()
+        session.get.return_value = page(3, None)
+        with mock.patch.object(spotify_client, "spotify_get", return_value=page(2, "https://api.spotify.com/next")) as first_page, \
+             mock.patch.object(spotify_client, "get_session", return_value=session):
+            items, error = spotify_client.get_playlist_items("playlist", "token", 4)
+        self.assertIsNone(error)
+        self.assertEqual(len(items), 4)
+        params = first_page.call_args.kwargs["params"]
+        self.assertEqual(params["limit"], 4)
+        self.assertIn("next", params["fields"])
+        self.assertEqual(session.get.call_args[0][0], "https://api.spotify.com/next")
+
     def test_recommend_media(self):
         for emotion_id in range(7):
             recommendations = recommend_media(emotion_id)
@@ -75,6 +584,252 @@ class WhiteBoxTest(unittest.TestCase):
         response = self.client.post('/live_webcam', data=data, content_type='multipart/form-data')
         self.assertIn(response.status_code, [200, 400], "Response should be 200 or 400 if no face is detected.")
     
+    def test_live_session_store_counts_and_expires(self):
+        store = MemoryLiveSessionStore(ttl=10, max_points=3)
+        for i, emotion_id in enumerate([5, 5, None, 3]):
+            store.record("a", emotion_id, 0.9 if emotion_id is not None else None, ts=1000 + i)
+        live = store._sessions["a"].snapshot()
+        self.assertEqual(live["frames"], 4)
+        self.assertEqual(live["counts"][5], 2)
+        self.assertEqual(live["counts"][3], 1)
+        self.assertEqual([point[1] for point in live["series"]], [5, None, 3], "Only the newest points are kept.")
+        store.record("b", 0, 0.5, ts=1020)
+        self.assertNotIn("a", store._sessions, "Streams idle past the TTL are evicted.")
+        self.assertIsNone(store.get("missing"))
+        with self.assertRaises(ValueError):
+            create_store("nope")
+
+    def test_live_webcam_uses_server_side_session(self):
+        frame = cv2.imencode('.jpg', np.zeros((img_size, img_size, 3), dtype=np.uint8))[1].tobytes()
+        face = np.array([[10, 10, 50, 50]])
+        client = app.test_client()
+        probabilities = np.array([[0.02, 0.02, 0.02, 0.1, 0.02, 0.8, 0.02]], dtype=np.float32)
+        with mock.patch('app.LIVE_TRACKING', False), \
+                mock.patch('app.classify_image', return_value=(face, [5], probabilities)), \
+                mock.patch('app.recommend_media', return_value={"music": [], "podcasts": []}), \
+                mock.patch('app.log_writer') as writer:
+            cookies = []
+            for _ in range(3):
+                response = client.post('/live_webcam', data={'frame': (io.BytesIO(frame), 'frame.jpg'), 'stream_id': 's1'},
+                                       content_type='multipart/form-data')
+                self.assertEqual(response.status_code, 200)
+                cookies.append(response.headers.get('Set-Cookie'))
+            self.assertTrue(all(cookie is None for cookie in cookies[1:]),
+                            "Frames after the first must not rewrite the session cookie.")
+            self.assertEqual(client.get('/live_summary', query_string={'stream_id': 'other'}).status_code, 400)
+            response = client.get('/live_summary', query_string={'stream_id': 's1'})
+            self.assertEqual(response.status_code, 200)
+            summary = response.get_json()
+            self.assertEqual(summary["highest_emotion"], "happy")
+            self.assertEqual(summary["frames"], 3)
+            self.assertEqual([round(point["confidence"], 4) for point in summary["timeline"]], [0.8] * 3)
+            writer.submit.assert_called_once()
+
+    def test_json_inference_mode(self):
+        frame = cv2.imencode('.jpg', np.zeros((240, 320, 3), dtype=np.uint8))[1].tobytes()
+        face = np.array([[10, 20, 50, 60]])
+        probabilities = np.array([[0.1, 0.0, 0.0, 0.2, 0.0, 0.7, 0.0]], dtype=np.float32)
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+        with mock.patch('app.LIVE_TRACKING', False), \
+                mock.patch('app.classify_image', return_value=(face, [5], probabilities)), \
+                mock.patch('app.recommend_media', return_value={"music": [], "podcasts": []}), \
+                mock.patch('app.log_writer'), \
+                mock.patch('app.result_cache', ResultCache()), \
+                mock.patch('app.annotate_faces') as annotate:
+            for url, field in (('/live_webcam', 'frame'), ('/upload_image', 'file')):
+                response = client.post(url, data={field: (io.BytesIO(frame), 'frame.jpg'), 'format': 'json'},
+                                       content_type='multipart/form-data')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.mimetype, 'application/json')
+                detections = response.get_json()
+                self.assertEqual((detections["width"], detections["height"]), (320, 240))
+                self.assertEqual(detections["faces"][0]["box"], [10, 20, 50, 60])
+                self.assertEqual(detections["faces"][0]["emotion"], "happy")
+                self.assertAlmostEqual(detections["faces"][0]["probabilities"]["happy"], 0.7, places=4)
+            annotate.assert_not_called()
+
+    def test_parallel_batch_upload_matches_sequential(self):
+        if not os.path.exists("img.jpg"):
+            self.skipTest("img.jpg not available")
+        with open("img.jpg", "rb") as f:
+            data = f.read()
+        with mock.patch('app.result_cache', ResultCache(max_bytes=0)), \
+                mock.patch('app.classify_faces', side_effect=lambda batch: np.tile(np.eye(7, dtype=np.float32)[3], (len(batch), 1))):
+            expected = classify_upload("img.jpg", data)
+            results = list(upload_executor.map(classify_upload, ["img.jpg"] * 8, [data] * 8))
+        self.assertGreater(len(expected["faces"]), 0)
+        self.assertEqual([result["faces"] for result in results], [expected["faces"]] * 8,
+                         "Concurrent detections on the shared detector match a sequential run.")
+
+    def test_upload_size_enforced_before_form_parsing(self):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+        body = b"x" * 8192
+        with mock.patch.dict(app.config, {'MAX_CONTENT_LENGTH': 4096}), \
+                mock.patch('app.read_upload', wraps=read_upload) as read:
+            for url, field in (('/upload_image', 'file'), ('/live_webcam', 'frame')):
+                response = client.post(url, data={field: (io.BytesIO(body), 'big.jpg')}, content_type='multipart/form-data')
+                self.assertEqual(response.status_code, 413, url)
+            read.assert_not_called()
+            response = client.post('/upload_images', data={'files': [(io.BytesIO(body), 'big.jpg')]},
+                                   content_type='multipart/form-data')
+            self.assertEqual(response.status_code, 200, "Batch uploads keep the larger request limit.")
+            self.assertEqual(response.get_json()[0]["error"], "Invalid image file.")
+
+    def test_result_cache_skips_model_for_duplicate_uploads(self):
+        image = cv2.imencode('.jpg', np.zeros((240, 320, 3), dtype=np.uint8))[1].tobytes()
+        face = np.array([[10, 20, 50, 60]])
+        probabilities = np.array([[0.1, 0.0, 0.0, 0.2, 0.0, 0.7, 0.0]], dtype=np.float32)
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+        cache = ResultCache()
+        with mock.patch('app.result_cache', cache), \
+                mock.patch('app.classify_image', return_value=(face, [5], probabilities)) as classify, \
+                mock.patch('app.recommend_media', return_value={"music": [], "podcasts": []}), \
+                mock.patch('app.log_writer'):
+            replies = [client.post('/upload_image', data={'file': (io.BytesIO(image), 'a.jpg')},
+                                   content_type='multipart/form-data') for _ in range(3)]
+            detections = client.post('/upload_image', data={'file': (io.BytesIO(image), 'a.jpg'), 'format': 'json'},
+                                     content_type='multipart/form-data').get_json()
+            batch = client.post('/upload_images', data={'files': [(io.BytesIO(image), 'b.jpg')]},
+                                content_type='multipart/form-data').get_json()
+        self.assertEqual(classify.call_count, 1, "Identical bytes reach the model once.")
+        self.assertEqual(len({reply.data for reply in replies}), 1)
+        self.assertEqual(replies[-1].headers['X-Emotions'], 'happy')
+        self.assertEqual(detections["faces"][0]["box"], [10, 20, 50, 60])
+        self.assertEqual((detections["width"], detections["height"]), (320, 240))
+        self.assertEqual(batch[0]["faces"], detections["faces"])
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (4, 1))
+        self.assertIsNotNone(cache.get(ResultCache.key(image)).jpeg, "The annotated JPEG is kept too.")
+
+        # Both the byte cap and the entry cap evict least recently used results
+        small = ResultCache(max_bytes=2048, max_entries=3)
+        for i in range(5):
+            small.put(bytes([i]), (10, 10), face, [5], probabilities)
+        self.assertLessEqual(small.stats()["bytes"], 2048)
+        self.assertIsNone(small.get(bytes([0])))
+        self.assertIsNotNone(small.get(bytes([4])))
+        self.assertGreater(small.stats()["evictions"], 0)
+        self.assertEqual(ResultCache(max_bytes=0).put(b"k", (10, 10), face, [5], probabilities).ids, (5,))
+
+    def test_face_tracker_skips_redundant_work(self):
+        rng = np.random.default_rng(0)
+        patch = rng.integers(0, 255, (60, 60), dtype=np.uint8)
+        position = [40, 50]
+        detect_calls, classify_calls = [], []
+
+        def frame():
+            gray = np.full((240, 320), 128, dtype=np.uint8)
+            gray[position[1]:position[1] + 60, position[0]:position[0] + 60] = patch
+            return gray
+
+        def detect(gray):
+            detect_calls.append(1)
+            return [(position[0], position[1], 60, 60)]
+
+        def classify(gray, boxes):
+            classify_calls.append(len(boxes))
+            # Alternate between two close calls to mimic a flickering classifier
+            probs = [0.0, 0.0, 0.0, 0.45, 0.0, 0.55, 0.0] if len(classify_calls) % 2 else [0.0, 0.0, 0.0, 0.5, 0.0, 0.5, 0.0]
+            return np.array([probs] * len(boxes))
+
+        tracker = FaceTracker(detect, classify, detect_every=5, window=4)
+        for _ in range(20):
+            position[0] += 2
+            boxes, emotions, _ = tracker.update(frame())
+            self.assertLessEqual(abs(int(boxes[0][0]) - position[0]), 2, "Boxes follow the face between detections.")
+            self.assertEqual(emotions, [5])
+        self.assertEqual(len(detect_calls), 4)
+        self.assertEqual(sum(classify_calls), 1, "An unchanged face is classified once.")
+
+        patch = 255 - patch
+        tracker.update(frame())
+        self.assertEqual(sum(classify_calls), 2, "A changed face is re-classified.")
+
+    def test_live_socket_drops_frames_when_behind(self):
+        class FakeSocket:
+            def __init__(self, frames):
+                self.frames = list(frames)
+                self.sent = []
+
+            def receive(self):
+                time.sleep(0.002)
+                return self.frames.pop(0) if self.frames else None
+
+            def send(self, data):
+                self.sent.append(data)
+
+        def slow_handler(frame):
+            time.sleep(0.02)
+            return b"annotated-" + frame
+
+        ws = FakeSocket(str(i).encode() for i in range(50))
+        stats = serve_frames(ws, slow_handler)
+        self.assertEqual(stats["received"], 50)
+        self.assertGreater(stats["dropped"], 0, "A slow handler must not see every frame.")
+        self.assertEqual(len(ws.sent), stats["processed"])
+        self.assertLessEqual(stats["processed"] + stats["dropped"], stats["received"])
+        numbers = [int(reply.split(b"-")[1]) for reply in ws.sent]
+        self.assertEqual(numbers, sorted(numbers), "Frames are answered in order.")
+
+    def test_live_socket_rejects_oversized_frames(self):
+        messages = [b"small", b"x" * 100]
+        def receive():
+            time.sleep(0.02)  # lets the worker take each frame before the next one arrives
+            return messages.pop(0) if messages else None
+        ws = mock.Mock(receive=receive)
+        handled = []
+        def handler(frame):
+            handled.append(frame)
+        stats = serve_frames(ws, handler, max_size=10)
+        self.assertEqual(handled, [b"small"], "An oversized frame is never decoded.")
+        self.assertEqual(stats["rejected"], 1)
+        self.assertIn("error", json.loads(ws.send.call_args[0][0]))
+
+    def test_decode_image_reduces_large_images(self):
+        img = np.zeros((200, 400, 3), dtype=np.uint8)
+        img[:, :200] = 255
+        jpeg = cv2.imencode('.jpg', img)[1].tobytes()
+        png = cv2.imencode('.png', img)[1].tobytes()
+        self.assertEqual(image_size(jpeg), (400, 200))
+        self.assertEqual(image_size(png), (400, 200))
+        self.assertIsNone(image_size(b"not an image"))
+
+        self.assertEqual(decode_factor((4000, 3000), 1600), 2)
+        self.assertEqual(decode_factor((4000, 3000), 500), 8)
+        self.assertEqual(decode_factor((1000, 800), 1600), 1)
+        self.assertEqual(decode_image(jpeg, max_side=100).shape, (50, 100, 3))
+        self.assertEqual(decode_image(jpeg, max_side=0).shape, (200, 400, 3))
+        self.assertEqual(decode_image(jpeg, max_side=100, grayscale=True).shape, (50, 100))
+        self.assertIsNone(decode_image(b"not an image"))
+
+        # EXIF orientation 6 (rotate 90 degrees clockwise) in an APP1 segment right after SOI
+        tiff = b"MM\x00\x2a\x00\x00\x00\x08" + struct.pack(">HHHIHH", 1, 0x0112, 3, 1, 6, 0) + b"\x00\x00\x00\x00"
+        app1 = b"Exif\x00\x00" + tiff
+        rotated = jpeg[:2] + b"\xff\xe1" + struct.pack(">H", len(app1) + 2) + app1 + jpeg[2:]
+        self.assertEqual(image_size(rotated), (400, 200))
+        upright = decode_image(rotated, max_side=0)
+        self.assertEqual(upright.shape, (400, 200, 3), "EXIF orientation is applied when decoding.")
+        self.assertGreater(upright[:200].mean(), 200, "Rotated clockwise, the white left half is on top.")
+        self.assertLess(upright[200:].mean(), 50)
+        self.assertEqual(decode_image(rotated, max_side=100).shape, (100, 50, 3))
+
+        class FakeUpload:
+            def __init__(self, data):
+                self.stream = io.BytesIO(data)
+
+        self.assertEqual(read_upload(FakeUpload(jpeg)), jpeg)
+        with self.assertRaises(ImageTooLarge):
+            read_upload(FakeUpload(b"x" * 200_000), max_bytes=100_000)
+        huge = png[:16] + struct.pack(">II", 20000, 20000) + png[24:]
+        with self.assertRaises(ImageTooLarge):
+            decode_image(huge)
+
     def test_feedback_submission(self):
         test_feedback = "This is a test feedback."
         data = {'feedback': test_feedback}